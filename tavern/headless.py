@@ -0,0 +1,97 @@
+'''
+Headless runner : build a tavern from a layout, and run the simulation
+as fast as possible, with no console, font or displayer.
+Used for soak runs, benchmarks, and days of simulation that should be
+over in seconds.
+
+    python -m tavern.headless --ticks 10000
+'''
+import argparse
+import random
+import time
+
+import groggy.events.bus as bus
+
+from tavern.debug import test_bootstrap
+from tavern.events.events import CUSTOMER_EVENT
+from tavern.people.employees import JOBS
+from tavern.world.customers import Customers
+from tavern.world.goods import GoodsList
+from tavern.world.pathfinding.backends import BACKENDS, DEFAULT_BACKEND
+from tavern.world.tavern import Tavern
+from tavern.world.world import World
+
+MAP_WIDTH = 100
+MAP_HEIGHT = 100
+
+# Functions building a tavern, given a game-like object
+# with tavern, world and customers attributes.
+LAYOUTS = {'debug': test_bootstrap}
+
+
+class HeadlessGame(object):
+    """The model of the game, without any user interface."""
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT, layout='debug',
+                 path_backend=DEFAULT_BACKEND):
+        self.tavern = Tavern(width, height, path_backend=path_backend)
+        self.world = World(self.tavern, GoodsList(), JOBS)
+        bus.bus.subscribe(self.world, bus.WORLD_EVENT)
+        bus.bus.subscribe(self.world, CUSTOMER_EVENT)
+        self.customers = Customers(self.tavern)
+        self.ticks = 0
+        if layout is not None:
+            LAYOUTS[layout](self)
+
+    def model_tick(self):
+        self.world.tick()
+        self.customers.tick()
+        self.ticks += 1
+
+    def run(self, ticks):
+        """Run ticks ticks, and return the number of ticks per second."""
+        start = time.perf_counter()
+        for _ in range(ticks):
+            self.model_tick()
+        elapsed = time.perf_counter() - start
+        if not elapsed:
+            return float('inf')
+        return ticks / elapsed
+
+    def close(self):
+        """Stop listening to the bus, so that another game can be run."""
+        for event in (bus.WORLD_EVENT, CUSTOMER_EVENT):
+            subscribers = bus.bus.events.get(event, [])
+            if self.world in subscribers:
+                subscribers.remove(self.world)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--ticks', type=int, default=10000,
+                        help='number of ticks to simulate')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS),
+                        default='debug')
+    parser.add_argument('--width', type=int, default=MAP_WIDTH)
+    parser.add_argument('--height', type=int, default=MAP_HEIGHT)
+    parser.add_argument('--backend', choices=sorted(BACKENDS),
+                        default=DEFAULT_BACKEND,
+                        help='pathfinding algorithm')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the random generator')
+    options = parser.parse_args(args)
+    if options.seed is not None:
+        random.seed(options.seed)
+    game = HeadlessGame(options.width, options.height, options.layout,
+                        options.backend)
+    try:
+        rate = game.run(options.ticks)
+        print('%d ticks at %.1f ticks per second, %d creatures, cash %d'
+              % (game.ticks, rate, len(game.tavern.creatures),
+                 game.tavern.cash))
+    finally:
+        game.close()
+    return rate
+
+
+if __name__ == '__main__':
+    main()
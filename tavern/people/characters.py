@@ -1,7 +1,8 @@
 import random
 from tavern.world.objects.functions import Functions
 from tavern.people.needs import Needs
-from tavern.people.tasks.tasks import ImpossibleTask, Wandering, Walking
+from tavern.people.tasks.tasks import (
+    ImpossibleTask, Waiting, Wandering, Walking)
 from tavern.people.tasks.patron import (
     Drinking, Ordering, Leaving, Seating, StandingUp, ReserveService,
     OpenService, TableOrder, WaitForOrder, Eating, Sleeping
@@ -56,12 +57,17 @@ class Creature(object):
         self.race = race
         self.examinable = examinable
         self.name = name
+        # The timing wheel the creature sleeps in, if it does
+        self.timers = None
+        # The position table of the tavern, once in it
+        self.table = None
 
     def to_pos(self):
         return (self.x, self.y, self.z)
 
     def is_at_pos(self, pos):
-        return self.to_pos() == pos
+        # Compared one by one, not to build a tuple
+        return self.x == pos[0] and self.y == pos[1] and self.z == pos[2]
 
     def race_string(self):
         return races_to_string[self.race]
@@ -76,11 +82,13 @@ class Creature(object):
         for act in activities:
             self.add_activity(act)
 
-    def add_walking_then_or(self, world_map, dest, then_acts, or_acts=None):
+    def add_walking_then_or(self, world_map, dest, then_acts, or_acts=None,
+                            path=None):
         """Add a walking activity to a point, then the list of activity in
-        [then], or, if the path is impossible, the [or] list."""
+        [then], or, if the path is impossible, the [or] list.
+        If the path is already known, it can be given."""
         try:
-            walking = Walking(world_map, self, dest)
+            walking = Walking(world_map, self, dest, path)
             self.add_activity(walking)
             self.add_activities(then_acts)
         except ImpossibleTask:
@@ -122,10 +130,51 @@ class Creature(object):
                 self.current_activity = None
                 self.next_activity(world)
 
+    def fail_activities(self):
+        """
+        Fail the current activity, and all the ones listed after it :
+        for plans that turn out impossible once their first steps are
+        done (e.g. a seat reserved by somebody else in the same tick).
+        """
+        for activity in self.activity_list:
+            activity.fail()
+        self.activity_list = []
+        if self.current_activity is not None:
+            self.current_activity.fail()
+            self.current_activity = None
+        self.wake_up()
+
+    def idle_ticks(self):
+        """
+        Number of coming ticks that would only count time for the
+        current activity : the world does not tick the creature then.
+        Activities that are over (e.g. failed by a command once the
+        tick was over) leave no idle tick.
+        """
+        activity = self.current_activity
+        if activity and not activity.failed and not activity.finished:
+            return activity.idle_ticks()
+        return 0
+
+    def skip(self, ticks):
+        """Catch up with ticks the creature was not ticked."""
+        if self.current_activity:
+            self.current_activity.skip(ticks)
+
+    def wake_up(self):
+        """
+        Tick the creature again, even if it was idle. To be called when
+        something changes for its current activity.
+        """
+        if self.timers is not None:
+            self.timers.wake(self)
+
     def move(self, pos):
         self.x = pos[0]
         self.y = pos[1]
         self.z = pos[2]
+        if self.table is not None:
+            self.table.moved(self)
 
     def next_activity(self, world):
         # If we had a to-do list, go on the next item
@@ -180,34 +229,35 @@ class Patron(Creature):
 
     def fetch_a_drink(self, world):
         # Let's try to find an open counter
-        counter = world.tavern_map.find_closest_object(self.to_pos(),
-                                                       Functions.ORDERING)
+        counter, path = world.tavern_map.find_closest_reachable(
+            self.to_pos(), Functions.ORDERING)
         if counter:
             self.add_walking_then_or(world.tavern_map, counter,
-                                     [Ordering()])
+                                     [Ordering()], path=path)
 
     def find_a_room(self, world_map):
-        available = world_map.service_list(Functions.SLEEPING)
-        if available:
-            pos = world_map.find_closest_in(available, self.to_pos())
+        pos, path = world_map.find_closest_reachable(self.to_pos(),
+                                                     Functions.SLEEPING)
+        if pos is not None:
             self.add_activity(ReserveService(pos, Functions.SLEEPING))
             self.add_walking_then_or(
                 world_map, pos,
                 [Sleeping(), OpenService(pos, Functions.SLEEPING)],
-                [OpenService(pos, Functions.SLEEPING), Wandering()])
+                [OpenService(pos, Functions.SLEEPING), Wandering()], path)
 
     def find_a_seat_and(self, world_map, actions):
-        available = world_map.service_list(Functions.SITTING)
-        if available:
-            pos = world_map.find_closest_in(available, self.to_pos())
+        pos, path = world_map.find_closest_reachable(self.to_pos(),
+                                                     Functions.SITTING)
+        if pos is not None:
             self.add_activity(ReserveService(pos, Functions.SITTING))
             self.add_walking_then_or(
                 world_map, pos, [Seating()] + actions +
                 [StandingUp(), OpenService(pos, Functions.SITTING)],
-                [OpenService(pos, Functions.SITTING), Wandering()])
+                [OpenService(pos, Functions.SITTING), Wandering()], path)
         else:
-            # For the moment, just wait
-            self.add_activity(Wandering())
+            # Wait for a seat to be free
+            self.add_activity(Waiting(world_map.services.subscriptions,
+                                      [Functions.SITTING]))
 
     def find_activity(self, world):
         """Tasks priority."""
@@ -1,4 +1,4 @@
-from tavern.people.tasks.tasks import Wandering
+from tavern.people.tasks.tasks import Waiting
 from tavern.world.objects.functions import Functions
 from tavern.people.characters import Creature
 from tavern.people.tasks.employee import EndTask
@@ -54,9 +54,10 @@ class Employee(Creature):
                     self.add_activities([task[1],
                                          EndTask(f, None, task[1])])
                 return
-        # If we are here, we didn't find a single task to do
-        # For the moment, just wander !
-        self.add_activity(Wandering())
+        # If we are here, we didn't find a single task to do :
+        # wait for one to be added.
+        self.add_activity(Waiting(world.tavern.tasks.subscriptions,
+                                  self.job.functions))
 
     def __str__(self):
         basic_display = "%s --- %s" %\
@@ -1,6 +1,3 @@
-from operator import itemgetter
-
-
 class Needs(object):
     THIRST = 0
     HUNGER = 1
@@ -37,7 +34,16 @@ class Needs(object):
         >>> n2.get_priority_needs() == Needs.THIRST
         True
         """
-        return max(self.as_dict().items(), key=itemgetter(1))[0]
+        # Compared one by one, not to build a dict at every decision.
+        # Ties go to the first need.
+        need, value = Needs.THIRST, self.thirst
+        if self.hunger > value:
+            need, value = Needs.HUNGER, self.hunger
+        if self.gamble > value:
+            need, value = Needs.GAMBLE, self.gamble
+        if self.sleep > value:
+            need = Needs.SLEEP
+        return need
 
     def cancel_needs(self):
         self.thirst = 0
@@ -0,0 +1,84 @@
+'''
+The position table : the packed positions of all the creatures of a
+tavern, in a NumPy array with a row per creature.
+
+Creatures write their row when they move (see Creature.move), and
+passes over the whole crowd (e.g. counting the occupants of every
+tile) are then made on the array, without visiting creatures one by one.
+
+Only positions are kept here. Needs, money, level and tasks stay on the
+creatures : creatures busy with a timer only task are not ticked at all
+(see TimingWheel), and the others read them when they decide, one
+creature at a time.
+'''
+import numpy as np
+
+# Packed position of a row that holds no creature
+NO_CREATURE = -1
+
+
+class PositionTable(object):
+    """
+    Packed positions (see CoordPacker) of the creatures of a tavern.
+    Rows of creatures that left are given to the next ones.
+    """
+    def __init__(self, coords, capacity=64):
+        self.coords = coords
+        self.positions = np.full(capacity, NO_CREATURE, dtype=np.int64)
+        # creature -> row
+        self.rows = {}
+        # Rows that held a creature, and are free again
+        self.free = []
+        # Number of rows ever used
+        self.used = 0
+        # Did a creature come, leave or move since this flag was reset ?
+        self.changed = False
+
+    def add(self, creature):
+        if self.free:
+            row = self.free.pop()
+        else:
+            if self.used == len(self.positions):
+                self._grow()
+            row = self.used
+            self.used += 1
+        self.rows[creature] = row
+        self.positions[row] = self.coords.pack(creature.to_pos())
+        self.changed = True
+        creature.table = self
+
+    def remove(self, creature):
+        row = self.rows.pop(creature, None)
+        if row is not None:
+            self.positions[row] = NO_CREATURE
+            self.free.append(row)
+            self.changed = True
+            creature.table = None
+
+    def moved(self, creature):
+        row = self.rows[creature]
+        position = self.coords.pack(creature.to_pos())
+        if self.positions[row] != position:
+            self.positions[row] = position
+            self.changed = True
+
+    def _grow(self):
+        positions = np.full(len(self.positions) * 2, NO_CREATURE,
+                            dtype=np.int64)
+        positions[:len(self.positions)] = self.positions
+        self.positions = positions
+
+    def occupancy(self):
+        """
+        The packed positions where creatures stand, sorted, and the
+        number of creatures standing there.
+        """
+        positions = self.positions[:self.used]
+        return np.unique(positions[positions != NO_CREATURE],
+                         return_counts=True)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, creature):
+        return creature in self.rows
@@ -33,6 +33,11 @@ class Serving(Task):
                 self.start_serving()
             super(Serving, self).tick(world_map, creature)
 
+    def idle_ticks(self):
+        if self.tick_time == 0:
+            return 0
+        return max(0, self.length - self.tick_time)
+
     def keep_task_if_constant(self):
         if self.constant:
             command = AddTask(self.nature, self.pos,
@@ -66,6 +71,7 @@ class TakeOrder(Task):
                               FollowRecipe(recipes[ordered], self.creature))
             self.call_command(command)
             ordering.order_taken = True
+            self.creature.wake_up()
             # ... and we are done !
             self.finish()
         else:
@@ -121,6 +127,7 @@ class GenerateGoods(Task):
 class FollowProcess(Task):
     def __init__(self, process):
         self.process = process
+        self.creature = None
         super(FollowProcess, self).__init__(length=self.process.time)
 
     def tick(self, world, creature):
@@ -131,6 +138,23 @@ class FollowProcess(Task):
                 self.call_command(command)
         self.check_length()
         super(FollowProcess, self).tick(world, creature)
+        # Known once the commands are given : if they fail while the
+        # creature ticks, the creature sees it (see Creature.tick).
+        self.creature = creature
+
+    def idle_ticks(self):
+        if self.tick_time == 0:
+            return 0
+        return max(0, self.length - self.tick_time)
+
+    def fail(self):
+        if self.failed:
+            return
+        super(FollowProcess, self).fail()
+        if self.creature is not None:
+            # Ingredients were missing once the tick was over : the
+            # creature, idle till the end of the process, must know now.
+            self.creature.fail_activities()
 
     def __str__(self):
         return self.process.name or "Preparing something"
@@ -144,6 +168,9 @@ class CookFood(Task):
         self.check_length()
         super(CookFood, self).tick(world, creature)
 
+    def idle_ticks(self):
+        return max(0, self.length - self.tick_time)
+
     def __str__(self):
         return "Cooking"
 
@@ -190,6 +217,7 @@ class ServeMealTask(Task):
     def tick(self, world_map, creature):
         if hasattr(self.recipient.current_activity, 'served'):
             self.recipient.current_activity.served = True
+            self.recipient.wake_up()
             self.finish()
         else:
             self.fail()
@@ -15,13 +15,22 @@ class ReserveService(Task):
     def __init__(self, pos, function):
         self.pos = pos
         self.function = function
+        self.creature = None
         super(ReserveService, self).__init__()
 
     def tick(self, world_map, creature):
+        self.creature = creature
         self.finish()
 
+    def fail(self):
+        super(ReserveService, self).fail()
+        if self.finished and self.creature is not None:
+            # The reservation was refused once the tick was over :
+            # the creature cannot go on with what came after it.
+            self.creature.fail_activities()
+
     def finish(self):
-        command = ReserveCommand(self.pos, self.function)
+        command = ReserveCommand(self.pos, self.function, linked_task=self)
         self.call_command(command)
         super(ReserveService, self).finish()
 
@@ -58,6 +67,9 @@ class Consuming(Task):
         else:
             super(Consuming, self).tick(world_map, creature)
 
+    def idle_ticks(self):
+        return max(0, self.length - self.tick_time)
+
     def after(self):
         raise NotImplementedError('Consuming is an abstract class !')
 
@@ -129,22 +141,32 @@ class StandingUp(Task):
 
 
 class Ordering(Task):
+    # Number of ticks a customer waits for someone at the counter
+    MAX_WAIT = 10
+
     def __init__(self):
         self.order_placed = False
+        # Where the creature waits for an ordering service to open
+        self.subscriptions = None
+        self.creature = None
         super(Ordering, self).__init__()
 
     def tick(self, world_map, creature):
+        self.subscriptions = world_map.services.subscriptions
+        self.creature = creature
         # Waited waaaay to long to get served
-        if not self.order_placed and self.tick_time > 10:
+        if not self.order_placed and self.tick_time > Ordering.MAX_WAIT:
             self.fail()
             creature.renounce("%s waited too long for being served.")
         elif not self.order_placed:
             if world_map.can_serve_at(Functions.ORDERING, creature.to_pos()):
+                self.unsubscribe()
                 command = OrderCommand(creature)
                 self.call_command(command)
                 self.order_placed = True
             else:
-                # Simply wait
+                # Simply wait, till somebody attends to a counter
+                self.subscriptions.subscribe(creature, [Functions.ORDERING])
                 super(Ordering, self).tick(world_map, creature)
         else:
             # Command was placed. The creature should have a drink.
@@ -159,6 +181,25 @@ class Ordering(Task):
                 # building
                 creature.renounce("%s cannot find anything to drink.")
 
+    def unsubscribe(self):
+        if self.subscriptions is not None:
+            self.subscriptions.unsubscribe(self.creature, [Functions.ORDERING])
+
+    def finish(self):
+        super(Ordering, self).finish()
+        self.unsubscribe()
+
+    def fail(self):
+        super(Ordering, self).fail()
+        self.unsubscribe()
+
+    def idle_ticks(self):
+        # Waiting to be served : the creature is woken up when
+        # an ordering service opens.
+        if self.order_placed or not self.tick_time:
+            return 0
+        return max(0, Ordering.MAX_WAIT - self.tick_time + 1)
+
     def pick_a_drink(self, creature):
         # Right now, everybody drinks classics drinks !
         return GoodsType.CLASSIC_DRINKS
@@ -198,9 +239,17 @@ class TableOrder(Task):
                     self.fail()
         super(TableOrder, self).tick(world_map, creature)
 
+    def idle_ticks(self):
+        # Nothing happens till the order is taken, or we are too angry
+        if self.tick_time == 0 or self.order_taken:
+            return 0
+        return max(0, self.length - self.tick_time + 1)
+
     def fail(self):
         super(TableOrder, self).fail()
-        self.call_command(self.reverse)
+        if self.tick_time:
+            # The order task was emitted : cancel it
+            self.call_command(self.reverse)
 
     def __str__(self):
         return "Waiting to order"
@@ -222,5 +271,10 @@ class WaitForOrder(Task):
             self.fail()
         super(WaitForOrder, self).tick(world_map, creature)
 
+    def idle_ticks(self):
+        if self.served:
+            return 0
+        return max(0, self.length - self.tick_time + 1)
+
     def __str__(self):
         return "Waiting for his meal"
@@ -1,5 +1,4 @@
-import libtcodpy as tcod
-from random import choice, randint
+from random import randint
 
 from groggy.events import bus
 
@@ -18,6 +17,16 @@ class Task(object):
     def tick(self, world_map, creature):
         self.tick_time += 1
 
+    def idle_ticks(self):
+        """
+        Number of coming ticks that would only increase the tick time.
+        The creature can skip them (see skip).
+        """
+        return 0
+
+    def skip(self, ticks):
+        self.tick_time += ticks
+
     def check_length(self):
         if self.tick_time == self.length:
             self.finish()
@@ -50,23 +59,104 @@ class Wandering(Task):
 
     def wander(self, world_map, creature):
         if randint(0, 2) == 0:
-            pos = choice(world_map.get_legit_moves_from(creature.to_pos()))
-            creature.move(pos)
+            pos = world_map.random_move_from(creature.to_pos())
+            if pos is None:
+                return
+            cooperation = world_map.cooperation
+            if cooperation is None or cooperation.is_free(pos, creature):
+                creature.move(pos)
 
     def __str__(self):
         return "Being idle"
 
 
+class Waiting(Task):
+    """
+    Do nothing till something of one of natures (Functions constants)
+    happens in subscriptions (see Subscriptions), or for length ticks.
+    """
+    def __init__(self, subscriptions, natures, length=100):
+        super(Waiting, self).__init__(length)
+        self.subscriptions = subscriptions
+        self.natures = natures
+        self.creature = None
+        self.woken = False
+
+    def tick(self, world_map, creature):
+        if self.tick_time == 0:
+            self.creature = creature
+            self.subscriptions.subscribe(self, self.natures)
+        if self.woken:
+            self.finish()
+        elif not self.check_length():
+            super(Waiting, self).tick(world_map, creature)
+
+    def idle_ticks(self):
+        if self.woken or not self.tick_time:
+            return 0
+        return max(0, self.length - self.tick_time)
+
+    def wake_up(self):
+        self.woken = True
+        if self.creature is not None:
+            self.creature.wake_up()
+
+    def finish(self):
+        super(Waiting, self).finish()
+        self.subscriptions.unsubscribe(self, self.natures)
+
+    def fail(self):
+        super(Waiting, self).fail()
+        self.subscriptions.unsubscribe(self, self.natures)
+
+    def __str__(self):
+        return "Waiting"
+
+
 class Walking(Task):
-    def __init__(self, world_map, creature, pos):
+    def __init__(self, world_map, creature, pos, path=None):
+        """
+        A path (a Path, or a list of (x, y, z) steps from the current
+        position of the creature) can be given if it is already known.
+        Raise ImpossibleTask right away if pos cannot be reached.
+        """
         super(Walking, self).__init__()
+        # Waiting for a requested path
+        self.planning = False
+        if path is None and not world_map.can_reach(creature.to_pos(), pos):
+            raise ImpossibleTask('%d, %d, %d cannot be reached from '
+                                 '%d, %d, %d'
+                                 % (pos + creature.to_pos()))
         self.dest = pos
-        self.path = None
+        self.path = path
+        self.path_length = 0
+        self.origin = None
+        # Steps planned for the next ticks, when walking cooperatively
+        self.window = None
+        self.window_time = 0
+        # Number of plans in a row bringing the creature no closer to
+        # its destination, and the closest it has been
+        self.waits = 0
+        self.closest = None
+        if path is not None:
+            self.path_length = len(path)
+            self.origin = creature.to_pos()
+
+    def has_valid_path(self, creature):
+        """Is there a given path, starting where the creature is ?"""
+        return self.path is not None and creature.is_at_pos(self.origin)
 
     def compute_path(self, world_map, creature):
+        self.planning = False
         if not creature.is_at_pos(self.dest):
-            self.path = world_map.path_from_to(creature.to_pos(), self.dest)
-            self.path_length = tcod.path_size(self.path)
+            path = world_map.request_path(creature, creature.to_pos(),
+                                          self.dest)
+            if path is None:
+                # The path will be searched later
+                self.planning = True
+                return
+            self.path = path
+            self.path_length = len(self.path)
             if self.path_length == 0:
                 self.fail()
                 raise ImpossibleTask('No path from %d, %d, %d to %d, %d, %d'
@@ -79,34 +169,79 @@ class Walking(Task):
             self.path_length = 0
             self.finish()
 
-    def tick(self, world_map, creature):
-        if self.tick_time == 0:
+    def repair_path(self, world_map, creature):
+        """
+        Go around an obstacle on the path, or if there is no way around
+        it, compute a whole new path.
+        """
+        path = world_map.repair_path(creature.to_pos(), self.path,
+                                     self.tick_time)
+        if path is None:
             self.compute_path(world_map, creature)
-        if self.tick_time < self.path_length:
-            x, y = tcod.path_get(self.path, self.tick_time)
-            z = creature.z
-            if not world_map[(x, y, z)].is_walkable():
-                # Path is not walkable anymore !
-                # We'll try to rebuild it...
-                self.compute_path(world_map, creature)
+        else:
+            self.path = path
+            self.path_length = len(path)
+            self.origin = creature.to_pos()
+            self.tick_time = 0
+
+    def walk_cooperatively(self, world_map, creature, cooperation):
+        """
+        Follow steps reserved a few ticks ahead, and plan the next ones
+        when half of them are walked, or when they are blocked.
+        Reservations are kept once arrived : the map drops them when
+        they are over.
+        """
+        if creature.is_at_pos(self.dest):
+            self.finish()
+            return
+        if self.window is None or\
+                self.window_time >= min(len(self.window),
+                                        cooperation.replan_after) or\
+                not world_map[self.window[self.window_time]].is_walkable():
+            # Did the last plan bring the creature closer ?
+            remaining = cooperation.distance(creature.to_pos(), self.dest)
+            if self.closest is not None and remaining >= self.closest:
+                self.waits += 1
             else:
-                creature.move((x, y, 0))
+                self.waits = 0
+                self.closest = remaining
+            self.window = cooperation.plan(creature, creature.to_pos(),
+                                           self.dest)
+            self.window_time = 0
+            if self.window is None:
+                self.fail()
+                return
+        creature.move(self.window[self.window_time])
+        self.window_time += 1
+        if creature.is_at_pos(self.dest):
+            self.finish()
+
+    def tick(self, world_map, creature):
+        cooperation = world_map.cooperation
+        if cooperation is not None and\
+                self.waits < cooperation.patience and\
+                cooperation.handles(creature.to_pos(), self.dest):
+            self.walk_cooperatively(world_map, creature, cooperation)
+            return
+        try:
+            if self.tick_time == 0 and not self.has_valid_path(creature):
+                self.compute_path(world_map, creature)
+            if self.tick_time < self.path_length and\
+                    not world_map[self.path[self.tick_time]].is_walkable():
+                # Path is not walkable anymore !
+                self.repair_path(world_map, creature)
+        except ImpossibleTask:
+            # The task has been failed, the creature will do something else
+            return
+        if self.planning:
+            return
+        if self.tick_time < self.path_length:
+            creature.move(self.path[self.tick_time])
         else:
             self.finish()
         super(Walking, self).tick(world_map, creature)
 
-    def finish(self):
-        super(Walking, self).finish()
-        self.free_path()
-
-    def fail(self):
-        super(Walking, self).fail()
-        self.free_path()
-
-    def free_path(self):
-        if self.path:
-            tcod.path_delete(self.path)
-            self.path = None
-
     def __str__(self):
+        if self.planning:
+            return "Finding the way to %s, %s, %s" % self.dest
         return "Going to %s, %s, %s" % self.dest
@@ -1,7 +1,8 @@
 from groggy.events import bus
 from tavern.events.events import MAIN_MENU_EVENT
 from tavern.world.objects.defaults import (
-    bed, door, chair, table, counter, beam, oven, work_station, brewing_vat)
+    bed, door, chair, table, counter, beam, oven, work_station, brewing_vat,
+    stairs)
 from tavern.world.objects.objects import Rooms
 
 CROSSHAIR = 0
@@ -19,6 +20,7 @@ objects_tree = {'d': {'display': 'Door', 'subobject': door},
                 't': {'display': 'Table', 'subobject': table},
                 'o': {'display': 'Counter', 'subobject': counter},
                 'b': {'display': 'Beam', 'subobject': beam},
+                's': {'display': 'Stairs', 'subobject': stairs},
                 'e': {'display': 'Bed', 'subobject': bed},
                 'v': {'display': 'Oven', 'subobject': oven},
                 'a': {'display': 'Brewing vat', 'subobject': brewing_vat},
@@ -0,0 +1,133 @@
+'''
+The background of a tavern map : a turbulence noise that should more or
+less look like an old map.
+
+Noise is computed with NumPy for the whole map at once, and kept in an
+on-disk cache so that we only compute it once for a given seed and
+map size.
+'''
+import os
+import tempfile
+
+import numpy as np
+
+# Default seed used for the background of new maps
+BACKGROUND_SEED = 2
+# Bump this when the noise algorithm changes to ignore old caches
+NOISE_VERSION = 1
+# Stands for the cache directory of the environment, looked up when
+# a background is made (see default_cache_directory)
+DEFAULT_CACHE = object()
+
+# The eight gradients used by the noise function
+GRADIENTS = np.array([(np.cos(a), np.sin(a))
+                      for a in np.arange(8) * np.pi / 4])
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+def gradient_noise(xs, ys, permutation):
+    """
+    Compute a 2D gradient noise (in the Perlin style) for all the
+    coords in the arrays xs and ys. Values are between -1 and 1.
+    """
+    x0 = np.floor(xs)
+    y0 = np.floor(ys)
+    fx = xs - x0
+    fy = ys - y0
+    xi = x0.astype(np.int64) & 255
+    yi = y0.astype(np.int64) & 255
+
+    def corner(dx, dy):
+        hashed = permutation[permutation[(xi + dx) & 255] + ((yi + dy) & 255)]
+        gradient = GRADIENTS[hashed & 7]
+        return gradient[..., 0] * (fx - dx) + gradient[..., 1] * (fy - dy)
+
+    u = _fade(fx)
+    v = _fade(fy)
+    bottom = corner(0, 0) + u * (corner(1, 0) - corner(0, 0))
+    top = corner(0, 1) + u * (corner(1, 1) - corner(0, 1))
+    # Gradient noise spans [-sqrt(2)/2, sqrt(2)/2]
+    return (bottom + v * (top - bottom)) * np.sqrt(2)
+
+
+def turbulence(width, height, seed, scale=0.01, octaves=32.0,
+               lacunarity=2.0, hurst=0.5):
+    """
+    Compute a turbulence (a fractal sum of absolute noise values)
+    for a width * height grid, sampling the noise every [scale].
+    Returns an array of shape (height, width), values between -1 and 1.
+    """
+    permutation = np.random.RandomState(seed).permutation(256)
+    permutation = np.concatenate([permutation, permutation])
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float64) * scale
+    value = np.zeros((height, width))
+    frequency = 1.0
+    for octave in range(int(octaves)):
+        # Octaves smaller than a tile would only add aliasing
+        if scale * frequency > 2:
+            break
+        noise = gradient_noise(xs * frequency, ys * frequency, permutation)
+        value += np.abs(noise) * lacunarity ** (-octave * hurst)
+        frequency *= lacunarity
+    return np.clip(value, -0.99999, 0.99999)
+
+
+def _cache_path(directory, width, height, seed):
+    name = 'background_v%d_%d_%dx%d.npy' % (NOISE_VERSION, seed,
+                                            width, height)
+    return os.path.join(directory, name)
+
+
+def _load(path, width, height):
+    try:
+        background = np.load(path)
+    except (OSError, ValueError):
+        return None
+    if background.shape != (height, width):
+        return None
+    return background
+
+
+def _save(path, background):
+    """Save the background, ignoring unwritable cache directories."""
+    try:
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so that a concurrent reader never
+        # finds a partial file.
+        handle, temporary = tempfile.mkstemp(dir=directory, suffix='.npy')
+        with os.fdopen(handle, 'wb') as f:
+            np.save(f, background)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+
+
+def default_cache_directory():
+    """The directory of the cache : $TAVERN_CACHE, or ~/.cache/tavern."""
+    return os.environ.get(
+        'TAVERN_CACHE',
+        os.path.join(os.path.expanduser('~'), '.cache', 'tavern'))
+
+
+def make_background(width, height, seed=BACKGROUND_SEED,
+                    cache_directory=DEFAULT_CACHE):
+    """
+    Get the background of a width * height map, from the cache if
+    possible. Pass None as cache_directory to disable the cache.
+    """
+    if cache_directory is DEFAULT_CACHE:
+        cache_directory = default_cache_directory()
+    path = None
+    if cache_directory is not None:
+        path = _cache_path(cache_directory, width, height, seed)
+        background = _load(path, width, height)
+        if background is not None:
+            return background
+    background = turbulence(width, height, seed).astype(np.float32)
+    if path is not None:
+        _save(path, background)
+    return background
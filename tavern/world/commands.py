@@ -2,6 +2,7 @@ from groggy.events.bus import bus
 from tavern.events.events import STATUS_EVENT, MONEY_EVENT
 from tavern.world.goods import sort_by_quality_and_price
 from tavern.world.goods import sort_by_price
+from tavern.world.services import ServiceError
 
 
 class Command(object):
@@ -34,7 +35,7 @@ class AttendToCommand(Command):
         # as places where the service is available.
         tiles_next_to = tav.get_immediate_neighboring_coords(self.pos)
         for x, y, z in tiles_next_to:
-            if tav.tiles[z][y][x].has_object_with_function(self.nature):
+            if tav[(x, y, z)].has_object_with_function(self.nature):
                 dir_x = x - self.pos[0]
                 dir_y = y - self.pos[1]
                 to_serve_x = x + dir_x
@@ -125,7 +126,8 @@ class AddToStore(Command):
             world.tavern.redispatch_store()
         else:
             bus.bus.publish('Not enough room to store %s' % self.goods)
-            self.linked_task.fail()
+            if self.linked_task:
+                self.linked_task.fail()
 
 
 class CreatureExit(Command):
@@ -169,16 +171,22 @@ class BuyCommand(Command):
 
 
 class ReserveCommand(Command):
-    def __init__(self, position, function, cancel=False):
+    def __init__(self, position, function, cancel=False, linked_task=None):
         self.position = position
         self.function = function
         self.cancel = cancel
+        self.linked_task = linked_task
 
     def execute(self, world):
         if self.cancel:
             world.tavern_map.open_service(self.function, self.position)
         else:
-            world.tavern_map.take_service(self.function, self.position)
+            try:
+                world.tavern_map.take_service(self.function, self.position)
+            except ServiceError:
+                # Somebody took it first
+                if self.linked_task:
+                    self.linked_task.fail()
 
 
 class AddTask(Command):
@@ -0,0 +1,38 @@
+'''
+Packed coordinates : a position (x, y, z) of a map stored as the single
+integer z * width * height + y * width + x.
+
+Registries that hash and compare positions all the time (services,
+rooms, reservations...) keep packed positions, which are cheaper to
+hash than tuples and need no allocation. Their methods still take and
+give (x, y, z) tuples, converted at their boundary.
+'''
+
+
+class CoordPacker(object):
+    """Pack the positions of a map of a given size, and unpack them."""
+    def __init__(self, width, height, depth):
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.floor_size = width * height
+        # Number of positions in the map
+        self.size = self.floor_size * depth
+
+    def pack(self, pos):
+        x, y, z = pos
+        return z * self.floor_size + y * self.width + x
+
+    def unpack(self, key):
+        z, rest = divmod(key, self.floor_size)
+        y, x = divmod(rest, self.width)
+        return (x, y, z)
+
+    def x_of(self, key):
+        return key % self.width
+
+    def y_of(self, key):
+        return key % self.floor_size // self.width
+
+    def z_of(self, key):
+        return key // self.floor_size
@@ -72,8 +72,10 @@ class BuildCommand(MapCommand):
         """
         for tile in tavern_map.get_neighboring_for(pos):
             if not tile.built:
-                tile.built = True
+                # Wall first, so that the tile is never seen as an
+                # empty built tile.
                 tile.wall = True
+                tile.built = True
 
 
 class PutCommand(MapCommand):
@@ -121,7 +123,7 @@ class PutCommand(MapCommand):
                 new_object.blocks = does_block
                 new_object.character = character
                 new_object.color = color
-                tile = world_map.tiles[z][y][x]
+                tile = world_map[(x, y, z)]
                 tile.tile_object = new_object
                 world_map.update_tile_walkability((x, y, z))
         after_put = object_type.after_put
@@ -151,10 +153,6 @@ class RoomCommand(MapCommand):
         self.room_type = room_type
 
     def execute(self, world):
-        for pos in self.area:
-            tile = world.tavern_map[pos]
-            tile.room_type = self.room_type
-
-        world.tavern_map.rooms[self.room_type].append(self.area)
+        world.tavern_map.add_room(self.room_type, self.area)
         if self.room_type == Rooms.STORAGE:
             world.store.add_cells(len(self.area))
@@ -40,7 +40,7 @@ def open_service(object_type, world, pos):
     if object_type.is_multi_tile():
         for pos_x, pos_y in object_type.service_coords:
             x2, y2 = x + pos_x, y + pos_y
-            if world_map.tiles[z][y2][x2].is_walkable():
+            if world_map[(x2, y2, z)].is_walkable():
                 world_map.open_service(object_type.function, (x2, y2, z))
     else:
         if object_type.blocks:
@@ -105,6 +105,10 @@ work_station = ObjectTemplate(
     color=Colors.WORKSHOP_ALBASTER, blocks=True,
     rules=[RoomsRule([Rooms.KITCHEN]), NotWallRule()], after_put=open_service)
 
+stairs = ObjectTemplate(name='Stairs', function=Functions.STAIRS, price=40,
+                        character='X', color=Colors.BEAM_LIGHT_WOOD,
+                        blocks=False, rules=[NotWallRule()])
+
 beam = ObjectTemplate(name='Beam', function=Functions.SUPPORT, price=10,
                       character='^', color=Colors.BEAM_LIGHT_WOOD,
                       blocks=True, rules=[NotWallRule()])
@@ -12,3 +12,4 @@ class Functions:
     BREWING = 10            # Preparing beer
     SELLING = 11            # Selling stuff in a shop
     SLEEPING = 12           # A place to sleep in
+    STAIRS = 13             # Going to another floor
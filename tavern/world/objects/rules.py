@@ -29,12 +29,8 @@ class OnlyOneInRoomRule(Rule):
         self.function = function
 
     def check(self, world_map, pos):
-        _, tiles = world_map.get_room_at(pos)
-        as_tiles = [world_map[pos] for pos in tiles]
-        objects = [t.tile_object for t in as_tiles if t.tile_object is not None]
-        objects_with_function = [o for o in objects
-                                 if o.function == self.function]
-        return not objects_with_function
+        room = world_map.room_at(pos)
+        return room is None or not room.has_object(self.function)
 
     def get_error_message(self):
         return "Can only put one in each room"
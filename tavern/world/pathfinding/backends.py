@@ -0,0 +1,244 @@
+'''
+Pathfinding backends : the algorithms running searches on a single floor.
+
+All backends search over the same walkability data, and give the same
+kind of results (a Path of steps, empty when there is no way), so that
+the map can use any of them, and benchmarks can compare them.
+Creatures move in 8 directions, and can cut corners, as in libtcod.
+'''
+import heapq
+import math
+
+import numpy as np
+
+from tavern.world.pathfinding.costs import (
+    cheapest_steps, weighted_distances)
+from tavern.world.pathfinding.fields import descend, distance_field
+from tavern.world.pathfinding.paths import Path
+
+# Cost of a diagonal move, the same as libtcod's default one
+DIAGONAL_COST = 1.41
+ALL_DIRECTIONS = [(-1, -1), (0, -1), (1, -1), (-1, 0),
+                  (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+def octile_cost(x, y, x2, y2):
+    dx = abs(x - x2)
+    dy = abs(y - y2)
+    return DIAGONAL_COST * min(dx, dy) + abs(dx - dy)
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+class PathBackend(object):
+    """A way to search paths on the floors of a map."""
+    name = None
+    # Can found paths be kept until walkability changes on them ?
+    cacheable = True
+    # Are searches made on the cost grid ? If not, the world does not
+    # keep the occupants of the grid up to date.
+    uses_costs = False
+
+    def __init__(self, tavern_map):
+        self.tavern_map = tavern_map
+        # Number of searches made
+        self.searches = 0
+
+    def search(self, origin, destination):
+        """Return the Path from origin to destination (same floor)."""
+        raise NotImplementedError('PathBackend is an abstract class !')
+
+
+class TcodBackend(PathBackend):
+    """libtcod's A*, run on the tcod map of every floor."""
+    name = 'tcod'
+
+    def search(self, origin, destination):
+        self.searches += 1
+        z = origin[2]
+        return self.tavern_map.path_pool.compute(
+            z, self.tavern_map.get_path_map(z), origin, destination)
+
+
+class BfsBackend(PathBackend):
+    """
+    A breadth-first search made with NumPy on whole arrays, from the
+    destination, then followed back from the origin. It explores the
+    whole area around the destination, but with no Python loop per tile.
+    """
+    name = 'bfs'
+
+    def search(self, origin, destination):
+        self.searches += 1
+        x, y, z = origin
+        x2, y2, _ = destination
+        mask = self.tavern_map.walkability.mask(z)
+        if origin == destination or not mask[y2, x2]:
+            return Path()
+        steps = descend(distance_field(mask, [(x2, y2)]), x, y)
+        if steps is None:
+            return Path()
+        return Path((sx, sy, z) for sx, sy in steps)
+
+
+class JpsBackend(PathBackend):
+    """
+    Jump Point Search : an A* that, on a grid where all moves cost the
+    same, jumps over the tiles that cannot change the shortest path and
+    only expands the tiles where the way might turn.
+    """
+    name = 'jps'
+
+    def __init__(self, tavern_map):
+        super(JpsBackend, self).__init__(tavern_map)
+        # Number of expanded jump points, to compare with other A*
+        self.expanded = 0
+
+    def search(self, origin, destination):
+        self.searches += 1
+        z = origin[2]
+        self.mask = self.tavern_map.walkability.mask(z)
+        self.height, self.width = self.mask.shape
+        start = (origin[0], origin[1])
+        self.goal = (destination[0], destination[1])
+        if start == self.goal or not self.walkable(*self.goal):
+            return Path()
+        costs = {start: 0}
+        parents = {start: None}
+        open_list = [(octile_cost(start[0], start[1], *self.goal),
+                      0, start, None)]
+        closed = set()
+        while open_list:
+            _, cost, node, direction = heapq.heappop(open_list)
+            if node in closed:
+                continue
+            closed.add(node)
+            self.expanded += 1
+            if node == self.goal:
+                return self._steps(parents, z)
+            for dx, dy in self._directions(node, direction):
+                jump_point = self._jump(node[0], node[1], dx, dy)
+                if jump_point is None or jump_point in closed:
+                    continue
+                new_cost = cost + octile_cost(node[0], node[1], *jump_point)
+                if new_cost < costs.get(jump_point, math.inf):
+                    costs[jump_point] = new_cost
+                    parents[jump_point] = node
+                    heapq.heappush(open_list,
+                                   (new_cost +
+                                    octile_cost(jump_point[0], jump_point[1],
+                                                *self.goal),
+                                    new_cost, jump_point, (dx, dy)))
+        return Path()
+
+    def walkable(self, x, y):
+        return 0 <= x < self.width and 0 <= y < self.height and\
+            bool(self.mask[y, x])
+
+    def _directions(self, node, direction):
+        """The directions worth exploring from node (pruned neighbours)."""
+        if direction is None:
+            return ALL_DIRECTIONS
+        x, y = node
+        dx, dy = direction
+        walkable = self.walkable
+        if dx and dy:
+            directions = [(dx, 0), (0, dy), (dx, dy)]
+            if not walkable(x - dx, y):
+                directions.append((-dx, dy))
+            if not walkable(x, y - dy):
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if not walkable(x, y + 1):
+                directions.append((dx, 1))
+            if not walkable(x, y - 1):
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if not walkable(x + 1, y):
+                directions.append((1, dy))
+            if not walkable(x - 1, y):
+                directions.append((-1, dy))
+        return directions
+
+    def _jump(self, x, y, dx, dy):
+        """
+        Go from x, y in the direction dx, dy until finding a jump point
+        (the goal, or a tile with a forced neighbour). Return it, or
+        None if an obstacle is met first.
+        """
+        walkable = self.walkable
+        while True:
+            x += dx
+            y += dy
+            if not walkable(x, y):
+                return None
+            if (x, y) == self.goal:
+                return (x, y)
+            if dx and dy:
+                if (walkable(x - dx, y + dy) and not walkable(x - dx, y)) or\
+                        (walkable(x + dx, y - dy) and not walkable(x, y - dy)):
+                    return (x, y)
+                # Straight jumps from a diagonal one
+                if self._jump(x, y, dx, 0) is not None or\
+                        self._jump(x, y, 0, dy) is not None:
+                    return (x, y)
+            elif dx:
+                if (walkable(x + dx, y + 1) and not walkable(x, y + 1)) or\
+                        (walkable(x + dx, y - 1) and not walkable(x, y - 1)):
+                    return (x, y)
+            else:
+                if (walkable(x + 1, y + dy) and not walkable(x + 1, y)) or\
+                        (walkable(x - 1, y + dy) and not walkable(x - 1, y)):
+                    return (x, y)
+
+    def _steps(self, parents, z):
+        """Fill the gaps between jump points."""
+        jump_points = []
+        node = self.goal
+        while node is not None:
+            jump_points.append(node)
+            node = parents[node]
+        jump_points.reverse()
+        steps = []
+        for (x, y), (x2, y2) in zip(jump_points, jump_points[1:]):
+            dx, dy = _sign(x2 - x), _sign(y2 - y)
+            while (x, y) != (x2, y2):
+                x += dx
+                y += dy
+                steps.append((x, y, z))
+        return Path(steps)
+
+
+class WeightedBackend(PathBackend):
+    """
+    The cheapest path according to the cost grid of the map (crowds,
+    objects in the way...). Costs change as creatures move, so these
+    paths are not cached.
+    """
+    name = 'weighted'
+    cacheable = False
+    uses_costs = True
+
+    def search(self, origin, destination):
+        self.searches += 1
+        x, y, z = origin
+        x2, y2, _ = destination
+        costs = self.tavern_map.costs.floor(z)
+        if origin == destination or not np.isfinite(costs[y2, x2]):
+            return Path()
+        distances = weighted_distances(costs, (x2, y2), (x, y))
+        steps = cheapest_steps(costs, distances, (x, y), (x2, y2))
+        if steps is None:
+            return Path()
+        return Path((sx, sy, z) for sx, sy in steps)
+
+
+# All backends, by name
+BACKENDS = dict((backend.name, backend)
+                for backend in [TcodBackend, BfsBackend, JpsBackend,
+                                WeightedBackend])
+DEFAULT_BACKEND = TcodBackend.name
@@ -0,0 +1,114 @@
+'''
+Batched path searches.
+
+Instead of searching their path one after the other, walkers can leave
+their request, and all the requests of a tick are searched at once on a
+pool of threads. libtcod releases the GIL while it searches, so the
+searches really run side by side.
+
+Every worker thread searches on its own copies of the tcod maps, taken
+again whenever walkability changed since its last copy. The copies are
+freed when the batch is closed.
+'''
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import libtcodpy as tcod
+
+from tavern.world.pathfinding.backends import TcodBackend
+from tavern.world.pathfinding.paths import Path
+
+
+class BatchPathfinder(object):
+    """
+    Collect the path requests of a tick, then search them all on a pool
+    of threads when flushed.
+    Only plain searches on a single floor are batched : walks planned
+    over doors or stairs are not handled here. Since the searches are
+    made with libtcod, batching only applies to the tcod backend.
+    """
+    def __init__(self, tavern_map, workers=None):
+        self.tavern_map = tavern_map
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(workers)
+        # (origin, destination) -> creatures waiting for this path
+        self.requests = {}
+        self.local = threading.local()
+        # (tcod map, tcod path) made by all the worker threads
+        self.allocated = []
+        self.lock = threading.Lock()
+        self.searches = 0
+
+    def handles(self, origin, destination):
+        return origin[2] == destination[2] and\
+            self.tavern_map.backend.name == TcodBackend.name and\
+            not self.tavern_map.planner.applies(origin, destination)
+
+    def request(self, creature, origin, destination):
+        key = (tuple(origin), tuple(destination))
+        self.requests.setdefault(key, []).append(creature)
+        # tcod maps are built here, by the main thread
+        self.tavern_map.get_path_map(origin[2])
+
+    def pending(self):
+        return len(self.requests)
+
+    def flush(self):
+        """
+        Search all requested paths, put them in the path cache of the map,
+        and return the creatures that were waiting for them.
+        """
+        if not self.requests:
+            return []
+        requests = self.requests
+        self.requests = {}
+        version = self.tavern_map.walkability.version
+        searches = [(key, self.executor.submit(self._search, key, version))
+                    for key in requests]
+        waiting = []
+        for key, search in searches:
+            self.tavern_map.path_cache.put(key[0], key[1], search.result())
+            waiting.extend(requests[key])
+        self.searches += len(searches)
+        return waiting
+
+    def _search(self, key, version):
+        """Run by the worker threads."""
+        origin, destination = key
+        z = origin[2]
+        floor_map, handle = self._local_map(z, version)
+        tcod.path_compute(handle, origin[0], origin[1],
+                          destination[0], destination[1])
+        return Path(tcod.path_get(handle, i) + (z,)
+                    for i in range(tcod.path_size(handle)))
+
+    def _local_map(self, z, version):
+        """The copy of the tcod map of floor z owned by this thread."""
+        maps = getattr(self.local, 'maps', None)
+        if maps is None:
+            maps = {}
+            self.local.maps = maps
+        source = self.tavern_map.path_maps[z]
+        if z not in maps:
+            floor_map = tcod.map_new(self.tavern_map.width,
+                                     self.tavern_map.height)
+            handle = tcod.path_new_using_map(floor_map)
+            maps[z] = [floor_map, handle, None]
+            with self.lock:
+                self.allocated.append((floor_map, handle))
+        local = maps[z]
+        if local[2] != version:
+            tcod.map_copy(source, local[0])
+            local[2] = version
+        return local[0], local[1]
+
+    def close(self):
+        self.executor.shutdown()
+        with self.lock:
+            allocated = self.allocated
+            self.allocated = []
+        for floor_map, handle in allocated:
+            tcod.path_delete(handle)
+            tcod.map_delete(floor_map)
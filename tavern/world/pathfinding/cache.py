@@ -0,0 +1,89 @@
+'''
+A cache for computed paths.
+
+Creatures walk the same routes over and over (counter to door, kitchen
+to table...), so paths are kept and given again until a tile of their
+route stops (or starts) being walkable.
+'''
+from collections import defaultdict
+
+from tavern.world.pathfinding.paths import Path
+
+
+class PathCache(object):
+    """
+    Paths, by (origin, destination). Every entry is tagged with
+    the walkability version it was computed at.
+    A path stays valid until walkability changes on one of its tiles.
+    The absence of a path is only valid as long as walkability does not
+    change at all, since any new walkable tile could open a way.
+    """
+    # Oldest entries are dropped past this size
+    MAX_ENTRIES = 4096
+
+    def __init__(self, walkability, max_entries=MAX_ENTRIES):
+        self.walkability = walkability
+        self.max_entries = max_entries
+        # (origin, destination) -> (version, steps)
+        self.entries = {}
+        # Keys of the paths going through every tile
+        self.routes_by_tile = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+        walkability.listeners.append(self)
+
+    def key(self, origin, destination):
+        return (tuple(origin), tuple(destination))
+
+    def get(self, origin, destination):
+        """Return the cached Path, or None."""
+        key = self.key(origin, destination)
+        entry = self.entries.get(key)
+        if entry is not None:
+            version, steps = entry
+            if steps or version == self.walkability.version:
+                self.hits += 1
+                return steps
+            # A way might have been opened since
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, origin, destination, steps):
+        key = self.key(origin, destination)
+        self.discard(key)
+        if len(self.entries) >= self.max_entries:
+            self.discard(next(iter(self.entries)))
+        if not isinstance(steps, Path):
+            steps = Path(steps)
+        self.entries[key] = (self.walkability.version, steps)
+        for step in steps:
+            self.routes_by_tile[step].add(key)
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for step in entry[1]:
+            keys = self.routes_by_tile.get(step)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.routes_by_tile[step]
+
+    def clear(self):
+        self.entries = {}
+        self.routes_by_tile = defaultdict(set)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return self.hits / float(total)
+
+    def walkability_changed(self, pos, walkable):
+        for key in list(self.routes_by_tile.get(pos, ())):
+            self.discard(key)
+
+    def __len__(self):
+        return len(self.entries)
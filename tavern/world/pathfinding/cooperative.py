@@ -0,0 +1,303 @@
+'''
+Cooperative pathfinding, in the style of Windowed Hierarchical
+Cooperative A* (WHCA*).
+
+Walkers reserve the tiles they will stand on for the next few ticks in
+a reservation table indexed by (tile, tick), and search their way in
+space and time, around the reservations of the others. Searches only
+look a window of ticks ahead, the rest of the way being estimated with
+a distance field of the destination, and walkers plan again every half
+window. The cost of a tick is then bounded by the number of walkers
+planning during it, however dense the crowd is.
+
+Creatures that do not walk cooperatively (standing at the counter,
+sitting, wandering...) are obstacles in their current position. The
+only tile several creatures can share is the destination of a walk, so
+that crowds can still gather around a service.
+
+Windowed searches cannot solve every jam (two walkers meeting head-on
+in a narrow corridor...) : a walker whose plans brought it no closer to
+its destination too many times in a row walks the rest of its way
+without cooperating.
+'''
+import heapq
+
+from tavern.world.pathfinding.fields import (
+    MOVES, UNREACHABLE, distance_field)
+
+# Number of ticks planned ahead by a walker
+DEFAULT_WINDOW = 8
+# Number of states a search can expand before giving up
+MAX_EXPANSIONS = 2000
+# Number of distance fields kept, one per destination
+MAX_FIELDS = 256
+# Plans bringing it no closer to its destination a walker accepts
+# before walking the rest of its way without cooperating
+PATIENCE = 3
+# Moves in space and time : waiting is one of them
+TIME_MOVES = MOVES + [(0, 0)]
+
+
+class ReservationTable(object):
+    """
+    The tiles reserved by walkers, by tick. A walker keeps the last
+    tile of its plan until it plans again : plans that are not renewed
+    in time (walks given up...) are dropped.
+    Tiles are kept packed (see CoordPacker), and a tile at a given tick
+    is the single integer tile + tick * coords.size.
+    """
+    def __init__(self, coords):
+        self.coords = coords
+        self.time = 0
+        # Packed (tile, tick) -> walker
+        self.reserved = {}
+        # tick -> reserved keys, to forget them once in the past
+        self.by_time = {}
+        # walker -> reserved keys, last tile and last tick
+        self.plans = {}
+        # Packed last tile of a plan -> (walker, tick it arrives there)
+        self.tails = {}
+        # Packed position -> creatures that do not walk cooperatively
+        self.standing = {}
+
+    def key(self, tile, tick):
+        """The key of a packed tile at tick."""
+        return tile + tick * self.coords.size
+
+    def reserved_by(self, tile, tick):
+        """The walker that reserved a packed tile at tick, or None."""
+        return self.reserved.get(tile + tick * self.coords.size)
+
+    def owner_of(self, tile, tick):
+        """The creature standing on a packed tile at tick, or None."""
+        owner = self.reserved.get(tile + tick * self.coords.size)
+        if owner is None:
+            owner, since = self.tails.get(tile, (None, None))
+            if owner is not None and tick < since:
+                owner = None
+        if owner is None:
+            owner = self.standing.get(tile)
+        return owner
+
+    def owner(self, pos, tick):
+        """The creature standing on pos at tick, or None."""
+        return self.owner_of(self.coords.pack(pos), tick)
+
+    def is_free(self, pos, tick, creature):
+        owner = self.owner(pos, tick)
+        return owner is None or owner is creature
+
+    def reserve(self, creature, steps):
+        """
+        Reserve a step per tick from the next one on, for creature.
+        Its previous reservations are dropped.
+        """
+        self.release(creature)
+        keys = []
+        for index, step in enumerate(steps):
+            tick = self.time + index + 1
+            key = self.key(self.coords.pack(step), tick)
+            self.reserved[key] = creature
+            self.by_time.setdefault(tick, []).append(key)
+            keys.append(key)
+        last_tick = self.time + len(steps)
+        tail = self.coords.pack(steps[-1])
+        self.tails[tail] = (creature, last_tick)
+        self.plans[creature] = (keys, tail, last_tick)
+
+    def release(self, creature):
+        plan = self.plans.pop(creature, None)
+        if plan is None:
+            return
+        keys, tail, _ = plan
+        for key in keys:
+            if self.reserved.get(key) is creature:
+                del self.reserved[key]
+        if self.tails.get(tail, (None,))[0] is creature:
+            del self.tails[tail]
+
+    def advance(self, creatures):
+        """
+        Go to the next tick. creatures are all the creatures of the map :
+        those without a plan will stand where they are.
+        """
+        for key in self.by_time.pop(self.time, []):
+            self.reserved.pop(key, None)
+        self.time += 1
+        present = set(creatures)
+        for creature, (_, _, last_tick) in list(self.plans.items()):
+            if creature not in present or last_tick < self.time:
+                self.release(creature)
+        self.standing = {}
+        pack = self.coords.pack
+        for creature in creatures:
+            if creature not in self.plans:
+                self.standing[pack(creature.to_pos())] = creature
+
+    def __len__(self):
+        return len(self.reserved)
+
+
+class CooperativePlanner(object):
+    """
+    Plan walks a window of ticks ahead, around the reservations of the
+    other walkers. Only walks on a single floor are planned : others
+    are left to the usual searches.
+    """
+    def __init__(self, walkability, coords, window=DEFAULT_WINDOW):
+        self.walkability = walkability
+        self.coords = coords
+        self.window = window
+        # Walkers plan again when half of their window is walked
+        self.replan_after = max(1, window // 2)
+        self.patience = PATIENCE
+        self.reservations = ReservationTable(coords)
+        # destination -> (walkability version, distance field)
+        self.fields = {}
+        self.searches = 0
+        self.expanded = 0
+
+    def handles(self, origin, destination):
+        return origin[2] == destination[2]
+
+    def advance(self, creatures):
+        self.reservations.advance(creatures)
+
+    def is_free(self, pos, creature):
+        """Can creature step on pos, and stay there ?"""
+        tick = self.reservations.time + 1
+        return self.reservations.is_free(pos, tick, creature) and\
+            self._can_stay(creature, self.coords.pack(pos), tick)
+
+    def distances(self, destination):
+        """Number of moves to destination, from every tile of its floor."""
+        version = self.walkability.version
+        known = self.fields.get(destination)
+        if known is not None and known[0] == version:
+            return known[1]
+        if len(self.fields) >= MAX_FIELDS:
+            self.fields = {}
+        x, y, z = destination
+        field = distance_field(self.walkability.mask(z), [(x, y)])
+        self.fields[destination] = (version, field)
+        return field
+
+    def distance(self, pos, destination):
+        """Number of moves from pos to destination, on their floor."""
+        x, y, _ = pos
+        return int(self.distances(tuple(destination))[y, x])
+
+    def plan(self, creature, origin, destination):
+        """
+        Search the steps of creature for the next ticks (waiting steps
+        included), and reserve them. Return None if destination cannot
+        be reached at all.
+        """
+        self.searches += 1
+        destination = tuple(destination)
+        field = self.distances(destination)
+        x, y, z = origin
+        if field[y, x] == UNREACHABLE and self.walkability.is_walkable(origin):
+            return None
+        self.reservations.release(creature)
+        steps = self._search(creature, origin, destination, field)
+        self.reservations.reserve(creature, steps)
+        return steps
+
+    def _heuristic(self, field, x, y):
+        height, width = field.shape
+        if 0 <= x < width and 0 <= y < height:
+            return int(field[y, x])
+        return UNREACHABLE
+
+    def _search(self, creature, origin, destination, field):
+        """A* in space and time, over the window."""
+        reservations = self.reservations
+        mask = self.walkability.mask(origin[2])
+        height, width = mask.shape
+        now = reservations.time
+        x, y, z = origin
+        # Packed position of the tile at 0, 0 of the floor
+        corner = self.coords.pack((0, 0, z))
+        goal = (destination[0], destination[1])
+        start = (x, y, 0)
+        parents = {start: None}
+        # Ties are broken in favor of the states further in time
+        open_list = [(self._heuristic(field, x, y), 0, start)]
+        closed = set()
+        expansions = 0
+        end = None
+        while open_list and expansions < MAX_EXPANSIONS:
+            _, depth, node = heapq.heappop(open_list)
+            if node in closed:
+                continue
+            closed.add(node)
+            x, y, t = node
+            if (x, y) == goal or t == self.window:
+                end = node
+                break
+            expansions += 1
+            for dx, dy in TIME_MOVES:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < width and 0 <= ny < height) or\
+                        not mask[ny, nx]:
+                    continue
+                next_node = (nx, ny, t + 1)
+                if next_node in parents:
+                    continue
+                to_goal = (nx, ny) == goal
+                tile = corner + ny * width + nx
+                if not self._can_move(creature, corner + y * width + x,
+                                      tile, now + t, to_goal):
+                    continue
+                # The destination is shared : walkers can stay there
+                # whatever the others planned
+                if not to_goal and t + 1 == self.window and\
+                        not self._can_stay(creature, tile, now + t + 1):
+                    continue
+                parents[next_node] = node
+                heapq.heappush(open_list,
+                               (t + 1 + self._heuristic(field, nx, ny),
+                                depth - 1, next_node))
+        self.expanded += expansions
+        if end is None or end == start:
+            # Boxed in : wait for the crowd to move
+            return [tuple(origin)]
+        steps = []
+        while parents[end] is not None:
+            steps.append((end[0], end[1], z))
+            end = parents[end]
+        steps.reverse()
+        return steps
+
+    def _can_move(self, creature, tile, next_tile, tick, to_goal):
+        """
+        Can creature go from the packed tile at tick to next_tile at
+        tick + 1 ?
+        """
+        reservations = self.reservations
+        if not to_goal:
+            # The destination is shared : only other tiles can be taken
+            owner = reservations.owner_of(next_tile, tick + 1)
+            if owner is not None and owner is not creature:
+                return False
+        if tile != next_tile:
+            # Two walkers cannot swap their tiles
+            other = reservations.reserved_by(next_tile, tick)
+            if other is not None and other is not creature and\
+                    reservations.reserved_by(tile, tick + 1) is other:
+                return False
+        return True
+
+    def _can_stay(self, creature, tile, tick):
+        """
+        Can creature stay on the packed tile from tick on ? Walks end on
+        such tiles, since their walkers stand there until they plan
+        again.
+        """
+        reservations = self.reservations
+        for later in range(tick, reservations.time + self.window + 2):
+            owner = reservations.reserved_by(tile, later)
+            if owner is not None and owner is not creature:
+                return False
+        return True
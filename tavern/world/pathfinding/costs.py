@@ -0,0 +1,202 @@
+'''
+Movement costs, for searches that should not only look for the shortest
+way : avoiding crowded places, going around patrons, etc.
+
+The cost of walking on every tile is kept in a NumPy array per floor,
+updated tile by tile when walkability, objects or occupants change.
+Weighted searches then run on whole arrays, without calling any Python
+function per explored tile.
+'''
+from collections import Counter
+
+import numpy as np
+
+from tavern.world.objects.functions import Functions
+from tavern.world.pathfinding.fields import MOVES
+from tavern.world.pathfinding.neighbors import shifted
+from tavern.world.tiles import NO_VALUE, TileWatcher
+
+# Cost of walking on an empty walkable tile
+BASE_COST = 1.0
+# Added cost of walking on a tile holding an object (chairs, beds...)
+OBJECT_COST = 1.0
+# Objects that are walked through without any added cost
+FREE_FUNCTIONS = (Functions.ROOM_SEPARATOR, Functions.STAIRS)
+# Added cost of the tiles around objects where people gather
+GATHERING_COSTS = {Functions.ORDERING: 1.0}
+# Added cost of a tile for every creature standing on it
+OCCUPANT_COST = 2.0
+DIAGONAL_COST = 1.41
+# (tile, number of occupants) pairs are compared as the single integer
+# packed tile * OCCUPANTS_BASE + number of occupants.
+OCCUPANTS_BASE = 1 << 20
+
+
+def _move_length(dx, dy):
+    if dx and dy:
+        return DIAGONAL_COST
+    return 1.0
+
+
+def weighted_distances(costs, destination, origin=None):
+    """
+    For every tile, the cheapest cost of going to destination, where
+    moving to a tile costs the cost of this tile (times 1.41 for a
+    diagonal move). Costs are relaxed on whole arrays until they settle :
+    every sweep costs O(tiles), and there are as many sweeps as moves on
+    the longest cheapest way, so O(tiles * path length) for a whole
+    field.
+
+    If origin is given, relaxing stops once its cost cannot improve
+    anymore (the tiles that changed last cost at least as much as it).
+    Only the tiles cheaper than origin are then exact : enough to go
+    down from origin (see cheapest_steps), in as many sweeps as moves
+    from origin to destination.
+    """
+    x, y = destination
+    distances = np.full(costs.shape, np.inf)
+    distances[y, x] = 0
+    moves = [(shifted(costs.shape, dx, dy), _move_length(dx, dy))
+             for dx, dy in MOVES]
+    changed = True
+    while changed:
+        changed = False
+        # The cheapest tile improved during this sweep
+        lowest = np.inf
+        for (tiles, neighbours), length in moves:
+            candidates = distances[neighbours] + costs[neighbours] * length
+            better = candidates < distances[tiles]
+            if better.any():
+                improved = candidates[better]
+                distances[tiles][better] = improved
+                lowest = min(lowest, improved.min())
+                changed = True
+        if origin is not None and lowest >= distances[origin[1], origin[0]]:
+            # Costs are positive : what improves later costs even more
+            break
+    return distances
+
+
+def cheapest_steps(costs, distances, origin, destination):
+    """
+    Go down the distances from origin to destination. Return the
+    list of (x, y) steps, or None if destination cannot be reached.
+    """
+    x, y = origin
+    height, width = costs.shape
+    if not np.isfinite(distances[y, x]):
+        return None
+    steps = []
+    while (x, y) != destination:
+        best = None
+        best_cost = np.inf
+        for dx, dy in MOVES:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                cost = distances[ny, nx] + costs[ny, nx] * _move_length(dx, dy)
+                if cost < best_cost:
+                    best = (nx, ny)
+                    best_cost = cost
+        if best is None:
+            return None
+        x, y = best
+        steps.append(best)
+    return steps
+
+
+class CostGrid(TileWatcher):
+    """
+    The cost of walking on every tile of a map. Unwalkable tiles cost
+    infinity. Occupants are given by the world, once per tick.
+    """
+    def __init__(self, store, walkability, coords):
+        self.store = store
+        self.walkability = walkability
+        self.coords = coords
+        self.costs = [None] * store.depth
+        self.occupants = Counter()
+        # Occupied tiles and their occupants, as sorted packed pairs
+        self.occupied = np.zeros(0, dtype=np.int64)
+        store.watchers.append(self)
+        walkability.listeners.append(self)
+
+    def floor(self, z):
+        """The cost array of floor z (do not modify it)."""
+        if self.costs[z] is None:
+            costs = np.full((self.store.height, self.store.width), np.inf)
+            self.costs[z] = costs
+            for y, x in zip(*np.nonzero(self.walkability.mask(z))):
+                costs[y, x] = self._cost((int(x), int(y), z))
+        return self.costs[z]
+
+    def cost_at(self, pos):
+        x, y, z = pos
+        return float(self.floor(z)[y, x])
+
+    def _cost(self, pos):
+        if not self.walkability.is_walkable(pos):
+            return np.inf
+        cost = BASE_COST + self.occupants[pos] * OCCUPANT_COST
+        function = self.store.get('function', pos)
+        if function != NO_VALUE and function not in FREE_FUNCTIONS:
+            cost += OBJECT_COST
+        x, y, z = pos
+        for dx, dy in MOVES:
+            x2, y2 = x + dx, y + dy
+            if 0 <= x2 < self.store.width and 0 <= y2 < self.store.height:
+                function = int(self.store.get('function', (x2, y2, z)))
+                cost += GATHERING_COSTS.get(function, 0)
+        return cost
+
+    def _refresh(self, pos, around=False):
+        x, y, z = pos
+        costs = self.costs[z]
+        if costs is None:
+            # Computed along with the whole floor when needed
+            return
+        positions = [pos]
+        if around:
+            positions.extend((x + dx, y + dy, z) for dx, dy in MOVES
+                             if 0 <= x + dx < self.store.width and
+                             0 <= y + dy < self.store.height)
+        for x2, y2, z2 in positions:
+            costs[y2, x2] = self._cost((x2, y2, z2))
+
+    def walkability_changed(self, pos, walkable):
+        self._refresh(pos)
+
+    def object_changed(self, pos, previous_function, function):
+        gathering = previous_function in GATHERING_COSTS or\
+            function in GATHERING_COSTS
+        self._refresh(pos, gathering)
+
+    def update_occupants(self, positions):
+        """Set where creatures stand, only refreshing tiles that changed."""
+        occupants = Counter(self.coords.pack(pos) for pos in positions)
+        keys = np.array(sorted(occupants), dtype=np.int64)
+        counts = np.array([occupants[key] for key in keys.tolist()],
+                          dtype=np.int64)
+        self.update_occupancy(keys, counts)
+
+    def update_occupancy(self, keys, counts):
+        """
+        Set where creatures stand, from the sorted packed positions of
+        the occupied tiles and their number of occupants (see
+        PositionTable.occupancy). Tiles that changed are found comparing
+        whole arrays, and only them are refreshed.
+        """
+        occupied = keys * OCCUPANTS_BASE + counts
+        changed = np.setxor1d(self.occupied, occupied, assume_unique=True)
+        self.occupied = occupied
+        if not len(changed):
+            return
+        changed = np.unique(changed // OCCUPANTS_BASE)
+        now = dict(zip(keys.tolist(), counts.tolist()))
+        unpack = self.coords.unpack
+        for key in changed.tolist():
+            pos = unpack(key)
+            if key in now:
+                self.occupants[pos] = now[key]
+            else:
+                self.occupants.pop(pos, None)
+            self._refresh(pos)
@@ -0,0 +1,128 @@
+'''
+Distance fields : for every tile, the number of moves to the closest
+available service of a given function.
+
+A field is shared by all creatures looking for the same service, and
+following it downhill leads to the closest reachable service, so that
+nobody has to run a search of its own.
+'''
+import numpy as np
+
+# Distance of tiles from which no service can be reached
+UNREACHABLE = np.iinfo(np.int32).max
+
+# The 8 moves a creature can do
+MOVES = [(-1, -1), (0, -1), (1, -1), (-1, 0),
+         (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+def dilate(mask):
+    """Grow a mask by one tile in the 8 directions."""
+    vertical = mask.copy()
+    vertical[1:, :] |= mask[:-1, :]
+    vertical[:-1, :] |= mask[1:, :]
+    grown = vertical.copy()
+    grown[:, 1:] |= vertical[:, :-1]
+    grown[:, :-1] |= vertical[:, 1:]
+    return grown
+
+
+def distance_field(walkable, sources):
+    """
+    Compute, with a breadth-first search run on whole arrays, the number
+    of moves from any walkable tile to the closest of the (x, y) sources.
+    """
+    distances = np.full(walkable.shape, UNREACHABLE, dtype=np.int32)
+    frontier = np.zeros(walkable.shape, dtype=bool)
+    for x, y in sources:
+        frontier[y, x] = True
+    frontier &= walkable
+    visited = frontier.copy()
+    distances[frontier] = 0
+    step = 0
+    while frontier.any():
+        step += 1
+        frontier = dilate(frontier) & walkable & ~visited
+        distances[frontier] = step
+        visited |= frontier
+    return distances
+
+
+def downhill(field, x, y):
+    """Return the neighbour of x, y with the lowest distance."""
+    height, width = field.shape
+    best = (None, None)
+    best_distance = field[y, x]
+    for dx, dy in MOVES:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < width and 0 <= ny < height and\
+                field[ny, nx] < best_distance:
+            best = (nx, ny)
+            best_distance = field[ny, nx]
+    return best
+
+
+def descend(field, x, y):
+    """
+    Follow a distance field downhill from x, y to one of its sources.
+    Return the (x, y) steps (x, y excluded), or None if no source can be
+    reached from there.
+    """
+    steps = []
+    if field[y, x] == UNREACHABLE:
+        # Creatures standing on a tile that was just made
+        # unwalkable can still step on a walkable neighbour.
+        x, y = downhill(field, x, y)
+        if x is None:
+            return None
+        steps.append((x, y))
+    while field[y, x] > 0:
+        x, y = downhill(field, x, y)
+        steps.append((x, y))
+    return steps
+
+
+class DistanceFields(object):
+    """
+    The distance fields of a map, by function and by floor. Fields are
+    computed on demand, and dropped when services of their function
+    open or close, or when walkability changes on their floor.
+    """
+    def __init__(self, walkability, services):
+        self.walkability = walkability
+        self.services = services
+        self.fields = {}
+        walkability.listeners.append(self)
+        services.listeners.append(self)
+
+    def walkability_changed(self, pos, walkable):
+        z = pos[2]
+        for key in [k for k in self.fields if k[1] == z]:
+            del self.fields[key]
+
+    def services_changed(self, function):
+        for key in [k for k in self.fields if k[0] == function]:
+            del self.fields[key]
+
+    def field(self, function, z):
+        field = self.fields.get((function, z))
+        if field is None:
+            sources = set((x, y) for x, y, sz
+                          in self.services.available[function] if sz == z)
+            field = distance_field(self.walkability.mask(z), sources)
+            self.fields[(function, z)] = field
+        return field
+
+    def closest(self, pos, function):
+        """
+        Find the closest reachable service of type function from pos.
+        Returns the position of the service and the (x, y, z) steps leading
+        there, or (None, None) if no service can be reached.
+        """
+        x, y, z = pos
+        steps = descend(self.field(function, z), x, y)
+        if steps is None:
+            return None, None
+        if steps:
+            x, y = steps[-1]
+        return (x, y, z), [(sx, sy, z) for sx, sy in steps]
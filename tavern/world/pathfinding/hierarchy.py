@@ -0,0 +1,292 @@
+'''
+Hierarchical pathfinding, in the style of HPA*.
+
+The map is seen as a graph of architectural units (the areas delimited
+by walls and doors) linked by doors. A long walk is first planned on
+this small graph, from door to door, and only the segments of the
+chosen route are then searched on the grid. Segments are kept in the
+path cache, so planning a walk through rooms that were already crossed
+costs a handful of lookups.
+
+The cost of going from a door to another door of the same unit is
+found with a breadth-first search limited to the unit (its tiles and
+its doors, in its bounding box), once for every door of the unit, the
+first time the unit is crossed. Costs are kept till walkability changes
+on the floor.
+'''
+import heapq
+
+import numpy as np
+
+from tavern.world.objects.functions import Functions
+from tavern.world.pathfinding.fields import MOVES, UNREACHABLE, distance_field
+from tavern.world.regions import NO_REGION
+from tavern.world.tiles import TileWatcher
+
+
+def chebyshev(pos, pos2):
+    """
+    Number of moves between two positions on an empty floor (the
+    Chebyshev distance : diagonal moves count as one, like the others).
+    """
+    return max(abs(pos[0] - pos2[0]), abs(pos[1] - pos2[1]))
+
+
+class DoorGraph(object):
+    """The doors of a floor, and the units each of them opens on."""
+    def __init__(self, doors, units_of):
+        # Units each door gives on
+        self.units_of = units_of
+        # Doors of each unit
+        self.doors_of = {}
+        # Doors right next to each door
+        self.next_doors = {}
+        # Bounding box (x, y, x2, y2) of each unit and its doors
+        self.windows = {}
+        door_set = set(doors)
+        for door in doors:
+            for unit in units_of[door]:
+                self.doors_of.setdefault(unit, []).append(door)
+            x, y, z = door
+            self.next_doors[door] = [(x + dx, y + dy, z) for dx, dy in MOVES
+                                     if (x + dx, y + dy, z) in door_set]
+
+    def neighbors(self, door):
+        """The doors one can go to from door without crossing another."""
+        neighbors = set(self.next_doors[door])
+        for unit in self.units_of[door]:
+            neighbors.update(self.doors_of[unit])
+        neighbors.discard(door)
+        return neighbors
+
+
+class HierarchicalPlanner(TileWatcher):
+    """
+    Plan paths over the door graph of a floor. The graph of a floor is
+    built the first time it is needed, and dropped when walls, floors
+    or doors change on it. Costs between doors are dropped when
+    walkability changes on the floor.
+    """
+    def __init__(self, store, units, walkability, segment):
+        """
+        Args:
+            store: The TileStore of the map.
+            units: The RegionLabels of the architectural units.
+            walkability: The Walkability of the map.
+            segment: A function computing (and caching) the list of
+                     (x, y, z) steps between two positions.
+        """
+        self.store = store
+        self.units = units
+        self.walkability = walkability
+        self.segment = segment
+        self.graphs = [None] * store.depth
+        # Per floor, unit -> door -> {other door of the unit: moves}
+        self.costs = [{} for _ in range(store.depth)]
+        # Number of searches limited to a unit, for monitoring
+        self.searches = 0
+        store.watchers.append(self)
+        walkability.listeners.append(self)
+
+    def tile_changed(self, pos):
+        self.graphs[pos[2]] = None
+        self.costs[pos[2]] = {}
+
+    def object_changed(self, pos, previous_function, function):
+        if Functions.ROOM_SEPARATOR in (previous_function, function):
+            self.graphs[pos[2]] = None
+            self.costs[pos[2]] = {}
+
+    def walkability_changed(self, pos, walkable):
+        self.costs[pos[2]] = {}
+
+    def graph(self, z):
+        graph = self.graphs[z]
+        if graph is None:
+            graph = self._build_graph(z)
+            self.graphs[z] = graph
+        return graph
+
+    def _build_graph(self, z):
+        floor = self.store.get_floor(z)
+        doors = []
+        units_of = {}
+        if floor is not None:
+            mask = ((floor.function == Functions.ROOM_SEPARATOR) &
+                    floor.walkable())
+            for y, x in zip(*np.nonzero(mask)):
+                door = (int(x), int(y), z)
+                doors.append(door)
+                units_of[door] = self._units_around(door)
+        return DoorGraph(doors, units_of)
+
+    def _units_around(self, pos):
+        x, y, z = pos
+        units = set()
+        for dx, dy in MOVES:
+            x2, y2 = x + dx, y + dy
+            if 0 <= x2 < self.store.width and 0 <= y2 < self.store.height:
+                units.add(self.units.label_at((x2, y2, z)))
+        units.discard(NO_REGION)
+        return units
+
+    def _ends(self, graph, pos):
+        """The doors a walk starting (or ending) at pos goes through."""
+        if pos in graph.units_of:
+            return [pos]
+        unit = self.units.label_at(pos)
+        if unit == NO_REGION:
+            return None
+        return graph.doors_of.get(unit, [])
+
+    def applies(self, origin, destination):
+        """Would a walk from origin to destination be planned over doors ?"""
+        return self._walk_ends(origin, destination) is not None
+
+    def _walk_ends(self, origin, destination):
+        """
+        The door graph of the floor of a walk, and the doors its start
+        and its end go through ; or None if it is not planned over doors.
+        """
+        z = origin[2]
+        if destination[2] != z:
+            return None
+        graph = self.graph(z)
+        starts = self._ends(graph, origin)
+        goals = self._ends(graph, destination)
+        if not starts or not goals:
+            return None
+        if self.units.label_at(origin) == self.units.label_at(destination)\
+                and origin not in graph.units_of:
+            return None
+        return graph, starts, goals
+
+    def path(self, origin, destination):
+        """
+        Return the list of (x, y, z) steps from origin to destination, or
+        None when planning over doors does not apply (both ends in the
+        same unit, different floors, ends out of any unit...) or did
+        not find a way : the caller should then run a plain search.
+        """
+        ends = self._walk_ends(origin, destination)
+        if ends is None:
+            return None
+        graph, starts, goals = ends
+        doors = self._plan(graph, origin, destination,
+                           self._end_costs(graph, origin, starts),
+                           self._end_costs(graph, destination, goals))
+        if doors is None:
+            return None
+        steps = []
+        for start, end in zip([origin] + doors, doors + [destination]):
+            if start != end:
+                segment = self.segment(start, end)
+                if not segment:
+                    return None
+                steps.extend(segment)
+        return steps
+
+    def _plan(self, graph, origin, destination, start_costs, goal_costs):
+        """
+        A* over the doors, from the costs of going from origin to its
+        doors and from the doors of destination to it. Return the doors
+        to go through, or None.
+        """
+        costs = {}
+        parents = {}
+        open_list = []
+        for door, cost in start_costs.items():
+            costs[door] = cost
+            parents[door] = None
+            heapq.heappush(open_list, (cost + chebyshev(door, destination),
+                                       cost, door))
+        closed = set()
+        while open_list:
+            _, cost, door = heapq.heappop(open_list)
+            if door in closed:
+                continue
+            closed.add(door)
+            if door == destination:
+                break
+            for neighbor, step_cost in self._edges(graph, door):
+                if neighbor in closed:
+                    continue
+                new_cost = cost + step_cost
+                if new_cost < costs.get(neighbor, new_cost + 1):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = door
+                    estimate = new_cost + chebyshev(neighbor, destination)
+                    heapq.heappush(open_list, (estimate, new_cost, neighbor))
+            if door in goal_costs:
+                new_cost = cost + goal_costs[door]
+                if new_cost < costs.get(destination, new_cost + 1):
+                    costs[destination] = new_cost
+                    parents[destination] = door
+                    heapq.heappush(open_list, (new_cost, new_cost,
+                                               destination))
+        if destination not in closed:
+            return None
+        doors = []
+        door = parents[destination]
+        while door is not None:
+            doors.append(door)
+            door = parents[door]
+        doors.reverse()
+        return doors
+
+    def _edges(self, graph, door):
+        """(door, moves) for the doors that can be reached from door."""
+        for neighbor in graph.next_doors[door]:
+            yield neighbor, 1
+        for unit in graph.units_of[door]:
+            for neighbor, cost in self._door_costs(graph, unit,
+                                                   door).items():
+                yield neighbor, cost
+
+    def _end_costs(self, graph, pos, doors):
+        """Number of moves between pos and the doors of its unit."""
+        if pos in graph.units_of:
+            return {pos: 0}
+        return self._unit_costs(graph, self.units.label_at(pos), pos, doors)
+
+    def _door_costs(self, graph, unit, door):
+        costs = self.costs[door[2]].setdefault(unit, {})
+        door_costs = costs.get(door)
+        if door_costs is None:
+            door_costs = self._unit_costs(graph, unit, door,
+                                          graph.doors_of[unit])
+            door_costs.pop(door, None)
+            costs[door] = door_costs
+        return door_costs
+
+    def _unit_costs(self, graph, unit, source, doors):
+        """
+        Number of moves from source to each of doors that can be reached
+        without leaving unit, found with a search limited to the unit.
+        """
+        x, y, z = source
+        x0, y0, x1, y1 = self._window(graph, unit, z)
+        labels = self.units.labels[z][y0:y1, x0:x1]
+        mask = (labels == unit) & self.walkability.mask(z)[y0:y1, x0:x1]
+        for door in graph.doors_of[unit]:
+            mask[door[1] - y0, door[0] - x0] = True
+        self.searches += 1
+        field = distance_field(mask, [(x - x0, y - y0)])
+        costs = {}
+        for door in doors:
+            distance = field[door[1] - y0, door[0] - x0]
+            if distance != UNREACHABLE:
+                costs[door] = int(distance)
+        return costs
+
+    def _window(self, graph, unit, z):
+        """The bounding box of a unit and its doors, ends excluded."""
+        window = graph.windows.get(unit)
+        if window is None:
+            ys, xs = np.nonzero(self.units.labels[z] == unit)
+            xs = list(xs) + [door[0] for door in graph.doors_of[unit]]
+            ys = list(ys) + [door[1] for door in graph.doors_of[unit]]
+            window = (int(min(xs)), int(min(ys)),
+                      int(max(xs)) + 1, int(max(ys)) + 1)
+            graph.windows[unit] = window
+        return window
@@ -0,0 +1,137 @@
+'''
+Neighbor tables, for the map queries made all the time (wandering,
+services opening around objects, walls built around floors...).
+
+The walkable neighbours of every tile are kept as a bitmask in a NumPy
+array, updated when walkability changes. The coordinates around a tile
+are computed the first time they are asked for, and kept only for the
+tiles actually looked up, so that large floors, mostly never visited,
+cost no more than their bitmask.
+'''
+from random import choice
+
+import numpy as np
+
+# The 8 neighbours of a tile. Bit i of a walkable mask tells if
+# the neighbour at NEIGHBOR_OFFSETS[i] is walkable.
+NEIGHBOR_OFFSETS = ((-1, -1), (0, -1), (1, -1), (-1, 0),
+                    (1, 0), (-1, 1), (0, 1), (1, 1))
+# The 4 orthogonal neighbours of a tile
+ORTHOGONAL_OFFSETS = ((0, -1), (-1, 0), (1, 0), (0, 1))
+# For every walkable mask, the neighbours set in it
+MASK_BITS = tuple(tuple(i for i in range(len(NEIGHBOR_OFFSETS))
+                        if mask & (1 << i))
+                  for mask in range(1 << len(NEIGHBOR_OFFSETS)))
+
+
+def shifted(shape, dx, dy):
+    """
+    The slices of the tiles p and of their neighbours q = p + (dx, dy),
+    for all p whose neighbour is in the floor.
+    """
+    height, width = shape
+    tiles = (slice(max(0, -dy), height - max(0, dy)),
+             slice(max(0, -dx), width - max(0, dx)))
+    neighbours = (slice(max(0, dy), height - max(0, -dy)),
+                  slice(max(0, dx), width - max(0, -dx)))
+    return tiles, neighbours
+
+
+def walkable_bits(walkable):
+    """For every tile of a floor, the mask of its walkable neighbours."""
+    bits = np.zeros(walkable.shape, dtype=np.uint8)
+    for index, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+        tiles, neighbours = shifted(walkable.shape, dx, dy)
+        bits[tiles] |= walkable[neighbours].astype(np.uint8) << index
+    return bits
+
+
+class NeighborTable(object):
+    """
+    The neighbours of the tiles of a map, by floor. Walkable masks of
+    a floor are computed the first time one of its tiles is looked up.
+    Tuples given by the table must not be modified.
+    """
+    def __init__(self, walkability):
+        self.walkability = walkability
+        store = walkability.store
+        self.width = store.width
+        self.height = store.height
+        # Walkable neighbours mask of every tile, by floor
+        self.bits = [None] * store.depth
+        # In-map neighbours, and walkable ones, of the tiles looked up,
+        # by floor : y * width + x -> tuple of (x, y, z)
+        self.around = [{} for _ in range(store.depth)]
+        self.orthogonal = [{} for _ in range(store.depth)]
+        self.moves = [{} for _ in range(store.depth)]
+        walkability.listeners.append(self)
+
+    def _bits(self, z):
+        bits = self.bits[z]
+        if bits is None:
+            bits = walkable_bits(self.walkability.mask(z))
+            self.bits[z] = bits
+        return bits
+
+    def _in_map(self, tables, pos, offsets):
+        x, y, z = pos
+        table = tables[z]
+        flat = y * self.width + x
+        coords = table.get(flat)
+        if coords is None:
+            coords = tuple((x + dx, y + dy, z) for dx, dy in offsets
+                           if 0 <= x + dx < self.width and
+                           0 <= y + dy < self.height)
+            table[flat] = coords
+        return coords
+
+    def neighbors(self, pos):
+        """The 8 connected coords of pos, but those outside the map."""
+        return self._in_map(self.around, pos, NEIGHBOR_OFFSETS)
+
+    def orthogonal_neighbors(self, pos):
+        """The orthogonal coords of pos, but those outside the map."""
+        return self._in_map(self.orthogonal, pos, ORTHOGONAL_OFFSETS)
+
+    def walkable_mask(self, pos):
+        x, y, z = pos
+        return int(self._bits(z)[y, x])
+
+    def legit_moves(self, pos):
+        """The walkable neighbours of pos."""
+        x, y, z = pos
+        moves = self.moves[z]
+        flat = y * self.width + x
+        coords = moves.get(flat)
+        if coords is None:
+            offsets = [NEIGHBOR_OFFSETS[index]
+                       for index in MASK_BITS[self._bits(z)[y, x]]]
+            coords = tuple((x + dx, y + dy, z) for dx, dy in offsets)
+            moves[flat] = coords
+        return coords
+
+    def random_move(self, pos):
+        """A random walkable neighbour of pos, or None if there is none."""
+        x, y, z = pos
+        directions = MASK_BITS[self._bits(z)[y, x]]
+        if not directions:
+            return None
+        dx, dy = NEIGHBOR_OFFSETS[choice(directions)]
+        return (x + dx, y + dy, z)
+
+    def walkability_changed(self, pos, walkable):
+        x, y, z = pos
+        bits = self.bits[z]
+        if bits is None:
+            # Will be read from the walkable mask when needed
+            return
+        moves = self.moves[z]
+        for index, (dx, dy) in enumerate(NEIGHBOR_OFFSETS):
+            # pos is the neighbour at (dx, dy) of the tile at -(dx, dy)
+            x2, y2 = x - dx, y - dy
+            if 0 <= x2 < self.width and 0 <= y2 < self.height:
+                if walkable:
+                    bits[y2, x2] |= 1 << index
+                else:
+                    bits[y2, x2] &= ~(1 << index) & 0xff
+                moves.pop(y2 * self.width + x2, None)
@@ -0,0 +1,116 @@
+'''
+Paths, and the native tcod objects used to compute them.
+
+A computed path is copied right away in a compact array, and the tcod
+path object goes back to a pool, to be used for the next search on the
+same floor. Nobody keeps a native handle for the length of a walk.
+'''
+from array import array
+
+import libtcodpy as tcod
+
+
+class Path(object):
+    """
+    A list of (x, y, z) steps, stored as a flat array of unsigned
+    shorts. Paths are never modified : adding or slicing them gives
+    new paths.
+    """
+    __slots__ = ('coords',)
+
+    def __init__(self, steps=()):
+        self.coords = array('H')
+        for step in steps:
+            self.coords.extend(step)
+
+    @classmethod
+    def from_coords(cls, coords):
+        path = cls()
+        path.coords = coords
+        return path
+
+    def __len__(self):
+        return len(self.coords) // 3
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, stride = index.indices(len(self))
+            if stride != 1:
+                return Path(self[i] for i in range(start, stop, stride))
+            stop = max(stop, start)
+            return Path.from_coords(self.coords[start * 3:stop * 3])
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        return tuple(self.coords[index * 3:index * 3 + 3])
+
+    def __iter__(self):
+        coords = self.coords
+        for index in range(0, len(coords), 3):
+            yield (coords[index], coords[index + 1], coords[index + 2])
+
+    def __add__(self, other):
+        if not isinstance(other, Path):
+            other = Path(other)
+        return Path.from_coords(self.coords + other.coords)
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def index(self, step):
+        return list(self).index(tuple(step))
+
+    def __repr__(self):
+        return 'Path(%r)' % list(self)
+
+
+class PathPool(object):
+    """
+    tcod path objects, by floor. A path object is tied to the tcod map
+    it was made with, so a floor only reuses its own path objects.
+    The outstanding counter tells how many path objects are in use : it
+    should always be back to 0 once a search is done.
+    """
+    def __init__(self):
+        self.free = {}
+        self.created = 0
+        self.outstanding = 0
+
+    def acquire(self, z, path_map):
+        handles = self.free.get(z)
+        if handles:
+            handle = handles.pop()
+        else:
+            handle = tcod.path_new_using_map(path_map)
+            self.created += 1
+        self.outstanding += 1
+        return handle
+
+    def release(self, z, handle):
+        self.outstanding -= 1
+        self.free.setdefault(z, []).append(handle)
+
+    def compute(self, z, path_map, origin, destination):
+        """Search a path on floor z, and return it as a Path."""
+        handle = self.acquire(z, path_map)
+        try:
+            tcod.path_compute(handle, origin[0], origin[1],
+                              destination[0], destination[1])
+            coords = array('H')
+            for i in range(tcod.path_size(handle)):
+                coords.extend(tcod.path_get(handle, i))
+                coords.append(z)
+            return Path.from_coords(coords)
+        finally:
+            self.release(z, handle)
+
+    def clear(self):
+        """Delete all the unused path objects."""
+        for handles in self.free.values():
+            for handle in handles:
+                tcod.path_delete(handle)
+        self.free = {}
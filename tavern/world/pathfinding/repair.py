@@ -0,0 +1,51 @@
+'''
+Local repair of paths.
+
+When something is put on the path of a walking creature, there is no
+need to search the whole way again : a detour around the obstacle,
+searched in a small window, can be spliced back into the rest of the
+path.
+'''
+from tavern.world.pathfinding.fields import descend, distance_field
+
+# How many steps ahead a detour can rejoin the path
+REPAIR_WINDOW = 8
+# How many tiles around the obstacle a detour can go
+REPAIR_MARGIN = 3
+
+
+def rejoin_index(path, start, is_walkable, window=REPAIR_WINDOW):
+    """
+    Find the first walkable step of path after the blocked step start,
+    on the same floor, at most window steps ahead. Return its index, or
+    None if the path cannot be rejoined nearby.
+    """
+    z = path[start][2]
+    for index in range(start + 1, min(start + window + 1, len(path))):
+        if path[index][2] != z:
+            return None
+        if is_walkable(path[index]):
+            return index
+    return None
+
+
+def detour(mask, origin, destination, margin=REPAIR_MARGIN):
+    """
+    Find the shortest way from origin to destination that stays in the
+    rectangle around them, grown by margin tiles. mask is the walkable
+    mask of their floor.
+    Return the (x, y, z) steps (origin excluded), or None.
+    """
+    x, y, z = origin
+    x2, y2, _ = destination
+    height, width = mask.shape
+    left = max(min(x, x2) - margin, 0)
+    top = max(min(y, y2) - margin, 0)
+    right = min(max(x, x2) + margin + 1, width)
+    bottom = min(max(y, y2) + margin + 1, height)
+    field = distance_field(mask[top:bottom, left:right],
+                           [(x2 - left, y2 - top)])
+    steps = descend(field, x - left, y - top)
+    if not steps:
+        return None
+    return [(sx + left, sy + top, z) for sx, sy in steps]
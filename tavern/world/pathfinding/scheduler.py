@@ -0,0 +1,62 @@
+'''
+Asynchronous path searches.
+
+Walkers leave their request and wait, planning, while a scheduler
+spends a fixed amount of time per tick on the pending searches. What
+cannot be searched in a tick is carried over to the next one, so that
+a burst of walkers never makes a single tick last longer than the
+budget (plus one search).
+'''
+import time
+from collections import OrderedDict
+
+# Time spent on searches at each tick, in seconds
+DEFAULT_BUDGET = 0.002
+
+
+class PathScheduler(object):
+    """
+    Search requested paths in the order they were requested, within a
+    time budget per tick. Found paths go in the path cache of the map,
+    where walkers find them when they are ticked again.
+    """
+    def __init__(self, tavern_map, budget=DEFAULT_BUDGET,
+                 clock=time.perf_counter):
+        self.tavern_map = tavern_map
+        self.budget = budget
+        self.clock = clock
+        # (origin, destination) -> creatures waiting for this path
+        self.requests = OrderedDict()
+        self.searches = 0
+
+    def handles(self, origin, destination):
+        return True
+
+    def request(self, creature, origin, destination):
+        key = (tuple(origin), tuple(destination))
+        creatures = self.requests.setdefault(key, [])
+        if creature not in creatures:
+            creatures.append(creature)
+
+    def pending(self):
+        return len(self.requests)
+
+    def flush(self):
+        """
+        Search paths until the budget is spent. At least one search is
+        made, so that walkers never wait forever. Walkers are left
+        planning until next tick : no creature is returned.
+        """
+        start = self.clock()
+        searched = 0
+        while self.requests:
+            if searched and self.clock() - start >= self.budget:
+                break
+            (origin, destination), _ = self.requests.popitem(last=False)
+            self.tavern_map.path_from_to(origin, destination)
+            searched += 1
+        self.searches += searched
+        return []
+
+    def close(self):
+        pass
@@ -0,0 +1,167 @@
+'''
+Moving between floors.
+
+Stairs put right above one another link two floors. Walks going from a
+floor to another are planned over the stairs, and the parts of the walk
+on a single floor are left to the usual (cached) floor searches, so that
+only the floors between the origin and the destination are searched.
+'''
+import heapq
+
+import numpy as np
+
+from tavern.world.objects.functions import Functions
+from tavern.world.pathfinding.hierarchy import chebyshev
+from tavern.world.tiles import TileWatcher
+
+
+def floor_distance(pos, pos2):
+    """Number of moves between two positions, ignoring obstacles."""
+    return chebyshev(pos, pos2) + abs(pos[2] - pos2[2])
+
+
+class StairsGraph(TileWatcher):
+    """
+    The stairs of a map, the floors they link, and which walkable areas
+    are connected through them.
+    Links are listed the first time they are needed, and listed again
+    after stairs are put or removed. Connected areas also depend on
+    walkability, and are computed again after it changes.
+    """
+    def __init__(self, store, walkability, reachability, segment):
+        """
+        Args:
+            store: The TileStore of the map.
+            walkability: The Walkability tracker of the map.
+            reachability: The RegionLabels of the walkable areas.
+            segment: A function computing (and caching) the list of
+                     steps between two positions of the same floor.
+        """
+        self.store = store
+        self.reachability = reachability
+        self.segment = segment
+        # Stairs of every floor, and the stairs they lead to
+        self.by_floor = None
+        self.links = None
+        # Walkable areas joined by stairs, by label
+        self.areas = None
+        store.watchers.append(self)
+        walkability.listeners.append(self)
+
+    def tile_changed(self, pos):
+        if self.store.get('function', pos) == Functions.STAIRS:
+            self.by_floor = None
+
+    def object_changed(self, pos, previous_function, function):
+        if Functions.STAIRS in (previous_function, function):
+            self.by_floor = None
+
+    def walkability_changed(self, pos, walkable):
+        self.areas = None
+
+    def _list_stairs(self):
+        self.by_floor = {}
+        self.links = {}
+        self.areas = None
+        stairs = set()
+        for z, floor in self.store.allocated_floors():
+            mask = (floor.function == Functions.STAIRS) & floor.walkable()
+            ys, xs = np.nonzero(mask)
+            self.by_floor[z] = [(int(x), int(y), z) for x, y in zip(xs, ys)]
+            stairs.update(self.by_floor[z])
+        for x, y, z in stairs:
+            self.links[(x, y, z)] = [(x, y, z2) for z2 in (z - 1, z + 1)
+                                     if (x, y, z2) in stairs]
+
+    def stairs_of(self, z):
+        if self.by_floor is None:
+            self._list_stairs()
+        return self.by_floor.get(z, [])
+
+    def linked_to(self, pos):
+        if self.by_floor is None:
+            self._list_stairs()
+        return self.links.get(pos, [])
+
+    def _root(self, label):
+        parent = self.areas.get(label, label)
+        if parent == label:
+            return label
+        root = self._root(parent)
+        self.areas[label] = root
+        return root
+
+    def _join_areas(self):
+        if self.by_floor is None:
+            self._list_stairs()
+        self.areas = {}
+        for pos, linked in self.links.items():
+            for other in linked:
+                root = self._root(self.reachability.label_at(pos))
+                other_root = self._root(self.reachability.label_at(other))
+                if root != other_root:
+                    self.areas[other_root] = root
+
+    def connects(self, label, label2):
+        """Are the walkable areas label and label2 joined by stairs ?"""
+        if self.by_floor is None or self.areas is None:
+            self._join_areas()
+        return self._root(label) == self._root(label2)
+
+    def path(self, origin, destination):
+        """
+        Return the list of (x, y, z) steps from origin to destination,
+        using the stairs of the floors in between. The list is empty if
+        there is no such path.
+        """
+        lowest = min(origin[2], destination[2])
+        highest = max(origin[2], destination[2])
+        costs = {origin: 0}
+        parents = {origin: None}
+        # Steps from the parent to every node, kept for the way back
+        segments = {}
+        open_list = [(floor_distance(origin, destination), 0, origin)]
+        closed = set()
+        while open_list:
+            _, cost, pos = heapq.heappop(open_list)
+            if pos in closed:
+                continue
+            closed.add(pos)
+            if pos == destination:
+                break
+            for neighbor, steps in self._moves(pos, destination,
+                                               lowest, highest):
+                if neighbor in closed:
+                    continue
+                new_cost = cost + len(steps)
+                if new_cost < costs.get(neighbor, new_cost + 1):
+                    costs[neighbor] = new_cost
+                    parents[neighbor] = pos
+                    segments[neighbor] = steps
+                    heapq.heappush(open_list,
+                                   (new_cost +
+                                    floor_distance(neighbor, destination),
+                                    new_cost, neighbor))
+        if destination not in closed:
+            return []
+        parts = []
+        pos = destination
+        while parents[pos] is not None:
+            parts.append(segments[pos])
+            pos = parents[pos]
+        return [step for part in reversed(parts) for step in part]
+
+    def _moves(self, pos, destination, lowest, highest):
+        """The (node, steps to go there) reachable from pos."""
+        z = pos[2]
+        targets = list(self.stairs_of(z))
+        if destination[2] == z:
+            targets.append(destination)
+        for target in targets:
+            if target != pos:
+                steps = self.segment(pos, target)
+                if steps:
+                    yield target, steps
+        for other in self.linked_to(pos):
+            if lowest <= other[2] <= highest:
+                yield other, [other]
@@ -0,0 +1,50 @@
+'''
+Tracking of walkable tiles, so that everything built on top of
+walkability (path maps, distance fields, caches...) can be told when
+a tile starts or stops being walkable.
+'''
+import numpy as np
+
+from tavern.world.tiles import TileWatcher
+
+
+class Walkability(TileWatcher):
+    """
+    Keep a copy of the walkable mask of every floor, and warn listeners
+    each time a tile walkability really changes. Listeners must have a
+    walkability_changed(pos, walkable) method.
+    """
+    def __init__(self, store):
+        self.store = store
+        # Incremented at each change, to tag things computed
+        # from the current walkability.
+        self.version = 0
+        self.listeners = []
+        self.masks = [None] * store.depth
+        for z, floor in store.allocated_floors():
+            self.masks[z] = floor.walkable()
+        store.watchers.append(self)
+
+    def mask(self, z):
+        """The walkable mask of floor z (do not modify it)."""
+        if self.masks[z] is None:
+            self.masks[z] = np.zeros((self.store.height, self.store.width),
+                                     dtype=bool)
+        return self.masks[z]
+
+    def is_walkable(self, pos):
+        x, y, z = pos
+        return self.masks[z] is not None and bool(self.masks[z][y, x])
+
+    def tile_changed(self, pos):
+        x, y, z = pos
+        walkable = self.store.is_walkable(pos)
+        mask = self.mask(z)
+        if mask[y, x] != walkable:
+            mask[y, x] = walkable
+            self.version += 1
+            for listener in self.listeners:
+                listener.walkability_changed(pos, walkable)
+
+    def object_changed(self, pos, previous_function, function):
+        self.tile_changed(pos)
@@ -0,0 +1,159 @@
+'''
+Labeling of connected regions of tiles.
+
+A region is a set of connected tiles sharing a property (e.g. "being
+an empty, built tile that is not a door"). Every tile knows the label
+of its region, and labels are updated incrementally when a tile
+changes, so that getting a whole region is a lookup instead of a search.
+'''
+import numpy as np
+
+from tavern.world.tiles import TileWatcher
+
+# Label of tiles that are not part of any region
+NO_REGION = 0
+
+
+class RegionLabels(TileWatcher):
+    """Connected regions of tiles, kept up to date as tiles change."""
+    def __init__(self, store, belongs, mask, neighbors):
+        """
+        Args:
+            store: The TileStore to watch.
+            belongs: A function telling if a position is part of a region.
+            mask: A function giving, for a Floor, the mask of all tiles
+                  being part of a region (the vectorized belongs).
+            neighbors: A function giving the coords connected to a
+                       position.
+        """
+        self.store = store
+        self.belongs = belongs
+        self.mask = mask
+        self.neighbors = neighbors
+        # One label array per floor, allocated along with the floor
+        self.labels = [None] * store.depth
+        # Positions of every region, by label
+        self.regions = {}
+        # Regions as lists, computed on demand
+        self.region_lists = {}
+        self.next_label = NO_REGION + 1
+        store.watchers.append(self)
+
+    def label_at(self, pos):
+        x, y, z = pos
+        labels = self.labels[z]
+        if labels is None:
+            return NO_REGION
+        return int(labels[y, x])
+
+    def region_at(self, pos):
+        """Return the list of all positions in the region of pos."""
+        label = self.label_at(pos)
+        if label == NO_REGION:
+            return []
+        region_list = self.region_lists.get(label)
+        if region_list is None:
+            region_list = sorted(self.regions[label])
+            self.region_lists[label] = region_list
+        return list(region_list)
+
+    def label_all(self):
+        """Label the whole store from scratch."""
+        self.labels = [None] * self.store.depth
+        self.regions = {}
+        self.region_lists = {}
+        for z, floor in self.store.allocated_floors():
+            for y, x in zip(*np.nonzero(self.mask(floor))):
+                pos = (int(x), int(y), z)
+                if self.label_at(pos) == NO_REGION:
+                    label = self._new_label()
+                    self.regions[label] = set()
+                    self._relabel(self._flood(pos, self._unlabeled), label)
+
+    def tile_changed(self, pos):
+        label = self.label_at(pos)
+        belongs = self.belongs(pos)
+        if belongs and label == NO_REGION:
+            self._add(pos)
+        elif not belongs and label != NO_REGION:
+            self._remove(pos, label)
+
+    def object_changed(self, pos, previous_function, function):
+        self.tile_changed(pos)
+
+    def _new_label(self):
+        label = self.next_label
+        self.next_label += 1
+        return label
+
+    def _set_label(self, pos, label):
+        x, y, z = pos
+        if self.labels[z] is None:
+            self.labels[z] = np.full((self.store.height, self.store.width),
+                                     NO_REGION, dtype=np.int32)
+        self.labels[z][y, x] = label
+
+    def _relabel(self, positions, label):
+        for pos in positions:
+            self._set_label(pos, label)
+        self.regions[label].update(positions)
+        self.region_lists.pop(label, None)
+
+    def _unlabeled(self, pos):
+        return self.label_at(pos) == NO_REGION and self.belongs(pos)
+
+    def _flood(self, start, accept):
+        """All positions connected to start through accepted positions."""
+        found = {start}
+        open_list = [start]
+        while open_list:
+            current = open_list.pop()
+            for neighbor in self.neighbors(current):
+                if neighbor not in found and accept(neighbor):
+                    found.add(neighbor)
+                    open_list.append(neighbor)
+        return found
+
+    def _add(self, pos):
+        """A new tile joins : create a region, or merge its neighbors."""
+        labels = set(self.label_at(n) for n in self.neighbors(pos))
+        labels.discard(NO_REGION)
+        if not labels:
+            label = self._new_label()
+            self.regions[label] = set()
+        else:
+            # Keep the label of the biggest region, relabel the others
+            label = max(labels,
+                        key=lambda label_id: len(self.regions[label_id]))
+            for other in labels - {label}:
+                self._relabel(self.regions.pop(other), label)
+                self.region_lists.pop(other, None)
+        self._relabel([pos], label)
+
+    def _remove(self, pos, label):
+        """A tile leaves : its region might be cut in several pieces."""
+        region = self.regions[label]
+        region.discard(pos)
+        self.region_lists.pop(label, None)
+        x, y, z = pos
+        self.labels[z][y, x] = NO_REGION
+        if not region:
+            del self.regions[label]
+            return
+        starts = [n for n in self.neighbors(pos) if self.label_at(n) == label]
+        pieces = []
+        for start in starts:
+            if any(start in piece for piece in pieces):
+                continue
+            piece = self._flood(start, lambda p: self.label_at(p) == label)
+            if len(piece) == len(region):
+                # Still in one piece
+                return
+            pieces.append(piece)
+        # The biggest piece keeps the label
+        pieces.sort(key=len, reverse=True)
+        for piece in pieces[1:]:
+            region.difference_update(piece)
+            new_label = self._new_label()
+            self.regions[new_label] = set()
+            self._relabel(piece, new_label)
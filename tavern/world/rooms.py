@@ -0,0 +1,127 @@
+'''
+Rooms defined by the player, and an index to find them quickly.
+'''
+from collections import Counter, defaultdict
+
+from tavern.world.tiles import NO_ROOM, NO_VALUE, TileWatcher
+
+
+class Room(object):
+    """A set of tiles the player gave a purpose to."""
+    def __init__(self, room_id, room_type, tiles, coords):
+        self.room_id = room_id
+        self.room_type = room_type
+        self.coords = coords
+        # Tiles are kept ordered (for storage display) and as a set
+        # of packed positions (for membership tests).
+        self.tiles = list(tiles)
+        self.tile_set = set(coords.pack(pos) for pos in self.tiles)
+        # Number of objects in the room, by function
+        self.objects = Counter()
+        self.compute_bounding_box()
+
+    def compute_bounding_box(self):
+        """Compute the (x, y, x2, y2) rectangle containing the room."""
+        if not self.tiles:
+            self.bounding_box = None
+            return
+        xs = [x for x, _, _ in self.tiles]
+        ys = [y for _, y, _ in self.tiles]
+        self.bounding_box = (min(xs), min(ys), max(xs), max(ys))
+
+    def remove_tiles(self, tiles):
+        pack = self.coords.pack
+        self.tile_set.difference_update(pack(pos) for pos in tiles)
+        self.tiles = [t for t in self.tiles if pack(t) in self.tile_set]
+        self.compute_bounding_box()
+
+    def count_objects(self, function):
+        return self.objects[function]
+
+    def has_object(self, function):
+        return self.objects[function] > 0
+
+    def __contains__(self, pos):
+        return self.coords.pack(pos) in self.tile_set
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __repr__(self):
+        return "Room %d (type %d, %d tiles)" % (self.room_id, self.room_type,
+                                                len(self.tiles))
+
+
+class RoomRegistry(TileWatcher):
+    """
+    All the rooms of a map. The id of the room each tile belongs to
+    is stored in the map tile store, so that finding the room at a
+    given position is a simple lookup.
+    """
+    def __init__(self, store, coords):
+        self.store = store
+        self.coords = coords
+        self.rooms = {}
+        # Rooms, by room type
+        self.by_type = defaultdict(list)
+        self.next_id = NO_ROOM + 1
+        store.watchers.append(self)
+
+    def add_room(self, room_type, tiles):
+        """
+        Make a new room out of tiles. Tiles already belonging to another
+        room are taken away from it.
+        """
+        room = Room(self.next_id, room_type, tiles, self.coords)
+        self.next_id += 1
+        self._take_from_other_rooms(room.tiles)
+        for pos in room.tiles:
+            self.store.set('room_id', pos, room.room_id)
+            self.store.set('room_type', pos, room_type)
+            function = self.store.get('function', pos)
+            if function != NO_VALUE:
+                room.objects[int(function)] += 1
+        self.rooms[room.room_id] = room
+        self.by_type[room_type].append(room)
+        return room
+
+    def _take_from_other_rooms(self, tiles):
+        previous_rooms = defaultdict(list)
+        for pos in tiles:
+            room = self.room_at(pos)
+            if room is not None:
+                previous_rooms[room].append(pos)
+        for room, taken in previous_rooms.items():
+            room.remove_tiles(taken)
+            for pos in taken:
+                function = self.store.get('function', pos)
+                if function != NO_VALUE:
+                    room.objects[int(function)] -= 1
+            if not room.tiles:
+                self.remove_room(room)
+
+    def remove_room(self, room):
+        for pos in room.tiles:
+            self.store.set('room_id', pos, NO_ROOM)
+            self.store.set('room_type', pos, NO_VALUE)
+        del self.rooms[room.room_id]
+        self.by_type[room.room_type].remove(room)
+
+    def room_at(self, pos):
+        """Return the room at position pos, or None."""
+        room_id = self.store.get('room_id', pos)
+        if room_id == NO_ROOM:
+            return None
+        return self.rooms[room_id]
+
+    def object_changed(self, pos, previous_function, function):
+        room = self.room_at(pos)
+        if room is None:
+            return
+        if previous_function != NO_VALUE:
+            room.objects[previous_function] -= 1
+        if function != NO_VALUE:
+            room.objects[function] += 1
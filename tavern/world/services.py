@@ -0,0 +1,174 @@
+'''
+Services offered in the tavern : places where a customer can sit,
+order, sleep, etc.
+'''
+from collections import defaultdict
+
+from tavern.world.subscriptions import Subscriptions
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceSet(object):
+    """
+    The positions offering one kind of service. The same position can
+    offer a service several times (e.g., a tile between two tables), so
+    we count how many times each position was added.
+    Positions are also sorted in square buckets, so that finding the
+    closest one only looks at nearby buckets.
+    Positions are kept packed (see CoordPacker), but given and returned
+    as (x, y, z) tuples.
+    """
+    BUCKET_SIZE = 8
+
+    def __init__(self, coords):
+        self.coords = coords
+        # Multiplicity of every packed position
+        self.counts = {}
+        self.size = 0
+        # Packed positions, by (x, y) bucket
+        self.buckets = defaultdict(set)
+
+    def bucket_of(self, pos):
+        return (pos[0] // ServiceSet.BUCKET_SIZE,
+                pos[1] // ServiceSet.BUCKET_SIZE)
+
+    def add(self, pos):
+        key = self.coords.pack(pos)
+        count = self.counts.get(key, 0)
+        if not count:
+            self.buckets[self.bucket_of(pos)].add(key)
+        self.counts[key] = count + 1
+        self.size += 1
+
+    def remove(self, pos):
+        """Remove one occurrence of pos, like list.remove would."""
+        key = self.coords.pack(pos)
+        count = self.counts.get(key, 0)
+        if not count:
+            raise ValueError('%s is not in the service set' % (pos,))
+        if count == 1:
+            del self.counts[key]
+            bucket_key = self.bucket_of(pos)
+            bucket = self.buckets[bucket_key]
+            bucket.discard(key)
+            if not bucket:
+                del self.buckets[bucket_key]
+        else:
+            self.counts[key] = count - 1
+        self.size -= 1
+
+    def closest_to(self, pos):
+        """
+        Return the position that is the closest to pos (using manhattan
+        distance on x and y), or None if the set is empty.
+        """
+        if not self.size:
+            return None
+        x, y = pos[0], pos[1]
+        bx, by = self.bucket_of(pos)
+        # No need to look farther than the farthest bucket
+        last_ring = max(max(abs(kx - bx), abs(ky - by))
+                        for kx, ky in self.buckets)
+        width = self.coords.width
+        floor_size = self.coords.floor_size
+        best = None
+        best_distance = None
+        for ring in range(last_ring + 1):
+            for bucket_key in self._ring(bx, by, ring):
+                for candidate in self.buckets.get(bucket_key, ()):
+                    rest = candidate % floor_size
+                    distance = abs(rest % width - x) + abs(rest // width - y)
+                    if best is None or distance < best_distance:
+                        best = candidate
+                        best_distance = distance
+            # Anything in the next ring is at least this far away
+            if best is not None and\
+                    best_distance <= ring * ServiceSet.BUCKET_SIZE:
+                break
+        if best is None:
+            return None
+        return self.coords.unpack(best)
+
+    def _ring(self, bx, by, ring):
+        """The keys of the buckets at exactly [ring] buckets from bx, by."""
+        if ring == 0:
+            return [(bx, by)]
+        keys = []
+        for kx in range(bx - ring, bx + ring + 1):
+            keys.append((kx, by - ring))
+            keys.append((kx, by + ring))
+        for ky in range(by - ring + 1, by + ring):
+            keys.append((bx - ring, ky))
+            keys.append((bx + ring, ky))
+        return keys
+
+    def __contains__(self, pos):
+        return self.coords.pack(pos) in self.counts
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for key, count in self.counts.items():
+            pos = self.coords.unpack(key)
+            for _ in range(count):
+                yield pos
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class ServiceRegistry(object):
+    """
+    All services of a map, by function, split between the ones that
+    are available and the ones currently in use.
+    Listeners are warned when the available services of a function
+    change, through their services_changed(function) method, and
+    subscribers waiting for a function are woken up when one of its
+    services opens.
+    """
+    def __init__(self, coords):
+        self.coords = coords
+        self.available = defaultdict(self.new_set)
+        self.used = defaultdict(self.new_set)
+        self.listeners = []
+        self.subscriptions = Subscriptions()
+
+    def new_set(self):
+        return ServiceSet(self.coords)
+
+    def warn_listeners(self, function):
+        for listener in self.listeners:
+            listener.services_changed(function)
+
+    def can_serve_at(self, function, pos):
+        return pos in self.available[function]
+
+    def take(self, function, pos):
+        if pos not in self.available[function]:
+            raise ServiceError(
+                'There was no available service of type %d in %d, %d, %d'
+                % ((function,) + tuple(pos)))
+        self.available[function].remove(pos)
+        self.used[function].add(pos)
+        self.warn_listeners(function)
+
+    def open(self, function, pos):
+        if pos in self.used[function]:
+            self.used[function].remove(pos)
+        self.available[function].add(pos)
+        self.warn_listeners(function)
+        self.subscriptions.notify(function)
+
+    def stop(self, function, pos):
+        self.available[function].remove(pos)
+        self.warn_listeners(function)
+
+    def closest(self, function, pos):
+        return self.available[function].closest_to(pos)
@@ -0,0 +1,38 @@
+'''
+Subscriptions, for creatures waiting for something to happen in the
+tavern (a service to open, a task to be added...) instead of checking
+for it every tick.
+'''
+from collections import defaultdict
+
+
+class Subscriptions(object):
+    """
+    Subscribers waiting for something of a given nature (a Functions
+    constant) : creatures, or tasks, with a wake_up method. They are
+    all woken up, once, the next time something of that nature happens.
+    """
+    def __init__(self):
+        # nature -> subscribers, as the keys of a dict to keep them
+        # in order of subscription
+        self.waiting = defaultdict(dict)
+
+    def subscribe(self, subscriber, natures):
+        for nature in natures:
+            self.waiting[nature][subscriber] = None
+
+    def unsubscribe(self, subscriber, natures):
+        for nature in natures:
+            waiting = self.waiting.get(nature)
+            if waiting:
+                waiting.pop(subscriber, None)
+
+    def notify(self, nature):
+        """Wake up the subscribers waiting for nature."""
+        waiting = self.waiting.pop(nature, None)
+        if waiting:
+            for subscriber in waiting:
+                subscriber.wake_up()
+
+    def __len__(self):
+        return sum(len(waiting) for waiting in self.waiting.values())
@@ -1,6 +1,8 @@
 from collections import defaultdict
 from itertools import chain
 
+from tavern.world.subscriptions import Subscriptions
+
 
 class TaskList(object):
     """
@@ -13,9 +15,12 @@ class TaskList(object):
         self.employee_tasks = defaultdict(list)
         self.task_history = []
         self.ongoing_tasks = []
+        # Employees waiting for a task, by nature
+        self.subscriptions = Subscriptions()
 
     def add_task(self, nature, coord, task):
         self.employee_tasks[nature].append((coord, task))
+        self.subscriptions.notify(nature)
 
     def has_task(self, function):
         return bool(self.employee_tasks[function])
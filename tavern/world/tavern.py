@@ -1,6 +1,8 @@
 from tavern.world.tavern_map import TavernMap
+from tavern.world.pathfinding.backends import DEFAULT_BACKEND
 from tavern.world.store import StorageSystem
 from tavern.world.task_list import TaskList
+from tavern.people.table import PositionTable
 from tavern.people.employees import make_recruit_out_of
 from itertools import chain
 from tavern.world.objects.objects import Rooms
@@ -11,8 +13,10 @@ class Tavern(object):
     manifestation (the TavernMap), its financial situation (cash),
     its storage situation (StorageSystem) the people inside (creatures).
     """
-    def __init__(self, width, height, cash=2000, tiles=None):
-        self.tavern_map = TavernMap(width, height, tiles)
+    def __init__(self, width, height, cash=2000, tiles=None,
+                 path_backend=DEFAULT_BACKEND):
+        self.tavern_map = TavernMap(width, height, tiles,
+                                    path_backend=path_backend)
         # Storage
         self.store = StorageSystem()
         # Money
@@ -20,27 +24,31 @@ class Tavern(object):
         # Creatures
         self.creatures = []
         self.employees = []
+        # Their positions, as arrays
+        self.table = PositionTable(self.tavern_map.coords)
         # Task list
         self.tasks = TaskList()
 
     def add_creature(self, creature):
         self.creatures.append(creature)
+        self.table.add(creature)
 
     def remove_creature(self, creature):
         self.creatures.remove(creature)
+        self.table.remove(creature)
 
     def handle_customer_event(self, event_data):
         if event_data.get('customer'):
-            self.creatures.append(event_data.get('customer'))
+            self.add_creature(event_data.get('customer'))
         elif event_data.get('recruit'):
             recruit = event_data.get('recruit')
             # First, we remove our recruit from the existing creature list...
-            self.creatures.remove(recruit)
+            self.remove_creature(recruit)
             # Then we rebuild it, anew !
             new_creature = make_recruit_out_of(recruit,
                                                event_data.get('profile'))
             # ... and we add it back to the list of creatures !
-            self.creatures.append(new_creature)
+            self.add_creature(new_creature)
             self.employees.append(new_creature)
 
     def creature_at(self, x, y, z):
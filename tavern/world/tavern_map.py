@@ -1,35 +1,116 @@
-from collections import defaultdict
+import numpy as np
 
 import libtcodpy as tcod
 from groggy.utils.geom import manhattan
 
+from tavern.world.background import make_background, BACKGROUND_SEED
+from tavern.world.coords import CoordPacker
 from tavern.world.objects.functions import Functions
-from tavern.world.objects.objects import rooms_to_name
+from tavern.world.pathfinding.backends import BACKENDS, DEFAULT_BACKEND
+from tavern.world.pathfinding.batch import BatchPathfinder
+from tavern.world.pathfinding.cache import PathCache
+from tavern.world.pathfinding.cooperative import (
+    DEFAULT_WINDOW, CooperativePlanner)
+from tavern.world.pathfinding.costs import CostGrid
+from tavern.world.pathfinding.fields import DistanceFields
+from tavern.world.pathfinding.hierarchy import HierarchicalPlanner
+from tavern.world.pathfinding.neighbors import NeighborTable
+from tavern.world.pathfinding.paths import Path, PathPool
+from tavern.world.pathfinding.scheduler import DEFAULT_BUDGET, PathScheduler
+from tavern.world.pathfinding.repair import detour, rejoin_index
+from tavern.world.pathfinding.stairs import StairsGraph
+from tavern.world.pathfinding.walkability import Walkability
+from tavern.world.regions import NO_REGION, RegionLabels
+from tavern.world.rooms import RoomRegistry
+from tavern.world.services import ServiceRegistry
+from tavern.world.tiles import TileStore, TileGrid, Tile
+
+# Number of floors of a map
+MAP_DEPTH = 10
+
+
+def fillable_mask(floor):
+    """Mask of the tiles of a floor that can be part of a room."""
+    return (floor.built & ~floor.wall &
+            (floor.function != Functions.ROOM_SEPARATOR))
+
+
+def walkable_mask(floor):
+    return floor.walkable()
 
 
 class TavernMap():
     """The map of a tavern, describing where things are,
     its rooms, entry points, etc."""
-    def __init__(self, width, height, cash=1000, tiles=None):
+    def __init__(self, width, height, cash=1000, tiles=None,
+                 seed=BACKGROUND_SEED, path_backend=DEFAULT_BACKEND):
         # Dimensions
         self.width = width
         self.height = height
         # A map-imitating fbm
-        self.background = self._build_background()
-        # A 3D list of tiles
-        self.tiles = tiles
-        # The rooms defined by the player
-        self.rooms = defaultdict(list)
+        self.background = make_background(width, height, seed)
+        # All tile properties, stored as arrays
+        self.store = tiles
+        if self.store is None:
+            self.store = self._build_tiles()
+        # Positions packed as integers, for registries
+        self.coords = CoordPacker(width, height, self.store.depth)
+        # The rooms defined by the player, and a dict of rooms by type
+        self.room_registry = RoomRegistry(self.store, self.coords)
+        self.rooms = self.room_registry.by_type
+        # Walkable tiles, and what must be updated when they change
+        self.walkability = Walkability(self.store)
+        self.walkability.listeners.append(self)
+        # Neighbours of every tile, and walkable ones
+        self.neighbors = NeighborTable(self.walkability)
+        # Architectural units : areas delimited by walls and doors
+        self.units = RegionLabels(self.store, self.is_fillable,
+                                  fillable_mask,
+                                  self.get_immediate_neighboring_coords)
+        # Walkable areas : two tiles with the same label are
+        # connected by a path.
+        self.reachability = RegionLabels(self.store, self.store.is_walkable,
+                                         walkable_mask,
+                                         self.get_neighboring_coords_for)
+        if tiles is not None:
+            self.units.label_all()
+            self.reachability.label_all()
         # Entry points to the tavern (main door)
         self.entry_points = []
-        if not self.tiles:
-            self.tiles = self._build_tiles()
-        # Pathfinding utility
-        self.path_map = self._build_path_map()
+        # A 3D view of tiles, to be indexed with tiles[z][y][x]
+        self.tiles = TileGrid(self.store)
+        # Pathfinding utility, one tcod map per floor, built on demand
+        self.path_maps = [None] * self.store.depth
+        # Reusable tcod path objects
+        self.path_pool = PathPool()
+        # Where walkers send their path requests, if they are not
+        # searched right away (see request_path).
+        self.path_requests = None
+        # Paths already computed, until their tiles change
+        self.path_cache = PathCache(self.walkability)
+        # Cost of walking on every tile, for weighted searches
+        self.costs = CostGrid(self.store, self.walkability, self.coords)
+        # Space-time reservations of walkers, if they avoid each other
+        # (see use_cooperative_pathfinding).
+        self.cooperation = None
+        # The algorithm used for searches on a floor
+        self.backend = None
+        self.use_backend(path_backend)
+        # Long walks are planned from door to door
+        self.planner = HierarchicalPlanner(self.store, self.units,
+                                           self.walkability,
+                                           self.path_segment)
+        # Walks between floors are planned from stairs to stairs
+        self.stairs = StairsGraph(self.store, self.walkability,
+                                  self.reachability, self.path_from_to)
         # A dict of all objects currently in use, by types
-        self.used_services = defaultdict(list)
+        self.services = ServiceRegistry(self.coords)
+        self.used_services = self.services.used
         # A dict of all objects currently being attended to by employees
-        self.available_services = defaultdict(list)
+        self.available_services = self.services.available
+        # Distances to the closest service of each type
+        self.distance_fields = DistanceFields(self.walkability,
+                                              self.services)
 
     def service_list(self, service):
         return self.available_services[service]
@@ -43,7 +124,7 @@ class TavernMap():
         param pos: A set of 3D coords
         type pos : A tuple (int, int, int)
         """
-        return pos in self.available_services[service]
+        return self.services.can_serve_at(service, pos)
 
     def get_room_at(self, pos):
         """Get what type of room is at position pos.
@@ -51,13 +132,31 @@ class TavernMap():
         param pos: A set of 3D coords
         type pos: A tuple (int, int, int)
 
-        returns: The room_type and all associated tiles
+        returns: The room_type and the Room (with all associated tiles)
         """
-        for room_type, lists in self.rooms.items():
-            for one_list in lists:
-                if pos in one_list:
-                    return room_type, one_list
-        return None, None
+        room = self.room_at(pos)
+        if room is None:
+            return None, None
+        return room.room_type, room
+
+    def room_at(self, pos):
+        """Get the Room at position pos, or None.
+
+        param pos: A set of 3D coords
+        type pos: A tuple (int, int, int)
+        """
+        return self.room_registry.room_at(pos)
+
+    def add_room(self, room_type, tiles):
+        """Define a new room of type room_type, made of tiles.
+
+        param room_type: A constant from Rooms
+        type room_type: int
+
+        param tiles: A list of 3D coords
+        type tiles: A list of tuples (int, int, int)
+        """
+        return self.room_registry.add_room(room_type, tiles)
 
     def take_service(self, function, pos):
         """
@@ -69,14 +168,10 @@ class TavernMap():
 
         param pos: A set of 3D coords
         type pos: A tuple (int, int, int)
+
+        raises: ServiceError if the service is not available
         """
-        self.used_services[function].append(pos)
-        try:
-            self.available_services[function].remove(pos)
-        except:
-            print("There was no available service of type %d in %d, %d, %d"
-                  % (function, pos[0], pos[1], pos[2]))
-            exit(0)
+        self.services.take(function, pos)
 
     def open_service(self, function, pos):
         """
@@ -92,9 +187,7 @@ class TavernMap():
         param pos: A set of 3D coords
         type pos: A tuple (int, int, int)
         """
-        if pos in self.used_services[function]:
-            self.used_services[function].remove(pos)
-        self.available_services[function].append(pos)
+        self.services.open(function, pos)
 
     def stop_service(self, function, pos):
         """
@@ -108,67 +201,48 @@ class TavernMap():
         param pos: A set of 3D coords
         type pos: A tuple (int, int, int)
         """
-        self.available_services[function].remove(pos)
+        self.services.stop(function, pos)
 
-    def _build_path_map(self):
-        path_map = []
-        for idz, column in enumerate(self.tiles):
-            floor_map = tcod.map_new(self.width, self.height)
-            path_map.append(floor_map)
-            for idy, line in enumerate(column):
-                for idx, tile in enumerate(line):
-                    tcod.map_set_properties(floor_map, idx, idy, False,
-                                            tile.is_walkable())
-        return path_map
+    def get_path_map(self, z):
+        """
+        Return the tcod map of floor z, building it the first
+        time it is needed.
+        """
+        floor_map = self.path_maps[z]
+        if floor_map is None:
+            floor_map = self._build_path_map(z)
+            self.path_maps[z] = floor_map
+        return floor_map
+
+    def _build_path_map(self, z):
+        # New tcod maps are not walkable : only set walkable cells
+        floor_map = tcod.map_new(self.width, self.height)
+        floor = self.store.get_floor(z)
+        if floor is not None:
+            for y, x in zip(*np.nonzero(floor.walkable())):
+                tcod.map_set_properties(floor_map, int(x), int(y),
+                                        False, True)
+        return floor_map
 
     def _build_tiles(self):
-        return [[[Tile(x, y, z, self.background[y][x])
-                for x in range(self.width)]
-                for y in range(self.height)]
-                for z in range(10)]
+        return TileStore(self.width, self.height, MAP_DEPTH,
+                         self.background)
 
     def fill_from(self, pos):
         """
         Filler function, mostly used to handle room definition.
         Will give all tiles from a starting coord that make an
         architectural unit - stopping at walls and doors.
+        Units are labeled as the map changes, so this is a lookup.
         """
-        def fillable(tile):
-            return not tile.wall and\
-                tile.built and\
-                not tile.is_separating_tile()
-        fill_list = []
-        x, y, z = pos
-        tile = self.tiles[z][y][x]
-        open_list = []
-        if fillable(tile):
-            open_list.append((x, y, z))
-        while open_list:
-            x_, y_, z_ = open_list.pop()
-            fill_list.append((x_, y_, z_))
-            tiles = self.get_immediate_neighboring_coords((x_, y_, z_))
-            for tx, ty, tz in tiles:
-                tile_ = self.tiles[tz][ty][tx]
-                if fillable(tile_) and (tx, ty, tz) not in fill_list:
-                    open_list.append((tx, ty, tz))
-        return fill_list
-
-    def _build_background(self):
-        """
-        Make a background noise that will more or less look like
-        an old map.
-        """
-        noise = tcod.noise_new(2)
-        tcod.noise_set_type(noise, tcod.NOISE_SIMPLEX)
-        background = []
-        for y in range(self.height):
-            background.append([])
-            for x in range(self.width):
-                background[y].append(
-                    tcod.noise_get_turbulence(noise,
-                                              [y / 100.0, x / 100.0], 32.0))
-        tcod.noise_delete(noise)
-        return background
+        return self.units.region_at(pos)
+
+    def is_fillable(self, pos):
+        """Can this tile be part of an architectural unit ?"""
+        return bool(self.store.get('built', pos) and
+                    not self.store.get('wall', pos) and
+                    self.store.get('function', pos) !=
+                    Functions.ROOM_SEPARATOR)
 
     def is_an_outside_wall(self, pos):
         """
@@ -182,32 +256,32 @@ class TavernMap():
         if len(neighbors) < 4:
             return True
         for (nx, ny, nz) in neighbors:
-            tile = self.tiles[nz][ny][nx]
+            tile = self[(nx, ny, nz)]
             if not tile.built:
                 return True
         return False
 
     def get_neighboring_coords_for(self, pos):
-        x, y, z = pos
-        return [(x2, y2, z2) for x2, y2, z2
-                in [(x - 1, y - 1, z),
-                    (x, y - 1, z),
-                    (x + 1, y - 1, z),
-                    (x - 1, y, z),
-                    (x + 1, y, z),
-                    (x - 1, y + 1, z),
-                    (x, y + 1, z),
-                    (x + 1, y + 1, z)]
-                if x2 >= 0 and x2 < self.width and
-                y2 >= 0 and y2 < self.height]
+        """
+        Return the 8 connected coords of pos, unless they are outside
+        the map. The tuple comes from the neighbor table : do not
+        modify it.
+        """
+        return self.neighbors.neighbors(pos)
 
     def get_legit_moves_from(self, pos):
         """
-        Return the tiles one can move from x, y and z.
+        Return the tiles one can move from x, y and z (a tuple from the
+        neighbor table, not to be modified).
+        """
+        return self.neighbors.legit_moves(pos)
+
+    def random_move_from(self, pos):
+        """
+        Return a random tile one can move to from pos, or None if
+        there is none.
         """
-        return [(x, y, z) for (x, y, z) in
-                self.get_neighboring_coords_for(pos)
-                if self.tiles[z][y][x].is_walkable()]
+        return self.neighbors.random_move(pos)
 
     def get_neighboring_for(self, pos):
         """
@@ -215,7 +289,7 @@ class TavernMap():
         orthogonally or diagonnally, unless they are
         outside the map.
         """
-        return [self.tiles[z][y][x] for x, y, z
+        return [self[(x, y, z)] for x, y, z
                 in self.get_neighboring_coords_for(pos)]
 
     def get_immediate_neighboring_coords(self, pos):
@@ -224,25 +298,158 @@ class TavernMap():
         neighbors coords of this tile if unless they
         are outside the map.
         """
-        x, y, z = pos
-        return [(x2, y2, z2) for x2, y2, z2
-                in [(x, y - 1, z),
-                    (x - 1, y, z),
-                    (x + 1, y, z),
-                    (x, y + 1, z)]
-                if x2 >= 0 and x2 < self.width and
-                y2 >= 0 and y2 < self.height]
+        return self.neighbors.orthogonal_neighbors(pos)
 
     def __repr__(self):
         return "Tavern map of size %d, %d" % (self.width, self.height)
 
     def path_from_to(self, pos_origin, pos_destination):
-        # For the moment, we do not handle Z movement
-        x, y, z = pos_origin
-        x2, y2, _ = pos_destination
-        path = tcod.path_new_using_map(self.path_map[z])
-        tcod.path_compute(path, x, y, x2, y2)
-        return path
+        """
+        Compute a path, and return it as a Path of (x, y, z) steps
+        (the origin excluded). The Path is empty if there is no path.
+        Walks going through doors are planned over the door graph first,
+        and walks to another floor over the stairs.
+        """
+        if not self.can_reach(pos_origin, pos_destination):
+            return Path()
+        steps = self._cached_path(pos_origin, pos_destination)
+        if steps is None:
+            if pos_origin[2] != pos_destination[2]:
+                steps = Path(self.stairs.path(pos_origin, pos_destination))
+            elif not self.backend.cacheable:
+                # Segments would not be cached : planning over doors
+                # would cost a search per segment, instead of one.
+                steps = self._compute_path(pos_origin, pos_destination)
+            else:
+                steps = self.planner.path(pos_origin, pos_destination)
+                if steps is None:
+                    steps = self._compute_path(pos_origin, pos_destination)
+                else:
+                    steps = Path(steps)
+            self._cache_path(pos_origin, pos_destination, steps)
+        return steps
+
+    def _cached_path(self, pos_origin, pos_destination):
+        if not self.backend.cacheable:
+            return None
+        return self.path_cache.get(pos_origin, pos_destination)
+
+    def _cache_path(self, pos_origin, pos_destination, steps):
+        if self.backend.cacheable:
+            self.path_cache.put(pos_origin, pos_destination, steps)
+
+    def repair_path(self, pos, path, blocked):
+        """
+        Go around a step of a path that is not walkable anymore.
+        pos is where the walker stands, and blocked the index of the
+        first step it cannot take. Return a new path from pos, made of a
+        short detour and the rest of the old path, or None if there is
+        no detour nearby.
+        """
+        rejoin = rejoin_index(path, blocked, self.store.is_walkable)
+        if rejoin is None or pos[2] != path[rejoin][2]:
+            return None
+        steps = detour(self.walkability.mask(pos[2]), pos, path[rejoin])
+        if steps is None:
+            return None
+        return Path(steps) + path[rejoin + 1:]
+
+    def can_reach(self, pos_origin, pos_destination):
+        """
+        Tell, without searching, if there is a path from pos_origin to
+        pos_destination. The origin does not have to be walkable
+        (something might have been put where a creature stands), but
+        the destination does.
+        """
+        if pos_origin == pos_destination:
+            return True
+        destination = self.reachability.label_at(pos_destination)
+        if destination == NO_REGION:
+            return False
+        origins = [self.reachability.label_at(pos_origin)]
+        if not self.store.is_walkable(pos_origin):
+            origins = [self.reachability.label_at(pos) for pos
+                       in self.get_neighboring_coords_for(pos_origin)]
+        for origin in set(origins):
+            if origin == destination:
+                return True
+            if origin != NO_REGION and\
+                    self.stairs.connects(origin, destination):
+                return True
+        return False
+
+    def use_backend(self, name):
+        """
+        Choose the algorithm used to search paths on a floor :
+        'tcod' (libtcod's A*), 'bfs' (NumPy breadth-first search),
+        'jps' (Jump Point Search) or 'weighted' (cheapest path on
+        the cost grid).
+        """
+        self.backend = BACKENDS[name](self)
+        # Paths found by another backend might not be the same
+        self.path_cache.clear()
+
+    def use_batch_pathfinding(self, workers=None):
+        """
+        Make the searches of a tick run together on a pool of threads,
+        at the end of the tick.
+        """
+        self._use_path_requests(BatchPathfinder(self, workers))
+
+    def use_async_pathfinding(self, budget=DEFAULT_BUDGET):
+        """
+        Make walkers wait for their path while searches are made
+        within a time budget (in seconds) per tick.
+        """
+        self._use_path_requests(PathScheduler(self, budget))
+
+    def use_cooperative_pathfinding(self, window=DEFAULT_WINDOW):
+        """
+        Make walkers reserve their way window ticks ahead, so that they
+        do not walk through each other. Pass None to stop it.
+        """
+        if window is None:
+            self.cooperation = None
+        else:
+            self.cooperation = CooperativePlanner(self.walkability,
+                                                  self.coords, window)
+
+    def _use_path_requests(self, path_requests):
+        if self.path_requests is not None:
+            self.path_requests.close()
+        self.path_requests = path_requests
+
+    def request_path(self, creature, pos_origin, pos_destination):
+        """
+        Like path_from_to, but when batch or async pathfinding is
+        enabled, searches are only requested : None is returned, and
+        the creature must wait for the world to flush the requests.
+        """
+        requests = self.path_requests
+        # Requested paths are handed over through the cache
+        if requests is None or not self.backend.cacheable or\
+                not requests.handles(pos_origin, pos_destination) or\
+                not self.can_reach(pos_origin, pos_destination):
+            return self.path_from_to(pos_origin, pos_destination)
+        steps = self.path_cache.get(pos_origin, pos_destination)
+        if steps is None:
+            requests.request(creature, pos_origin, pos_destination)
+        return steps
+
+    def path_segment(self, pos_origin, pos_destination):
+        """
+        Like path_from_to, but always with a plain search : used
+        for the parts of a walk that stay in a single unit.
+        """
+        steps = self._cached_path(pos_origin, pos_destination)
+        if steps is None:
+            steps = self._compute_path(pos_origin, pos_destination)
+            self._cache_path(pos_origin, pos_destination, steps)
+        return steps
+
+    def _compute_path(self, pos_origin, pos_destination):
+        # A search on a single floor
+        return self.backend.search(pos_origin, pos_destination)
 
     def __coords_to_distance(self, coords, pos):
         """
@@ -317,7 +524,7 @@ class TavernMap():
         while not found_wall:
             x += dirx
             y += diry
-            if self.tiles[z][y][x].wall:
+            if self.store.get('wall', (x, y, z)):
                 return counter
             counter += 1
 
@@ -331,73 +538,57 @@ class TavernMap():
         if we're looking from the point of view of a patron or the
         point of view of an employee.
         Return the coords of this object."""
-        return self.find_closest_in(self.available_services[function], pos)
+        return self.services.closest(function, pos)
+
+    def find_closest_reachable(self, pos, function):
+        """Find the available service of this type that is the closest
+        to pos by walking distance.
+
+        param pos: A set of 3D coords
+        type pos: A tuple (int, int, int)
+
+        param function: A constant from the Functions list
+        type function: int
+
+        returns: The position of the service and the Path to go
+        there, or (None, None) if there is none in reach.
+        """
+        service, steps = self.distance_fields.closest(pos, function)
+        if steps is None:
+            return None, None
+        return service, Path(steps)
 
     def add_walkable_tile(self, pos):
+        self.update_tile_walkability(pos)
+
+    def walkability_changed(self, pos, walkable):
         x, y, z = pos
-        tcod.map_set_properties(self.path_map[z], x, y, False, True)
+        # A floor without a path map will read its tiles when needed
+        if self.path_maps[z] is not None:
+            tcod.map_set_properties(self.path_maps[z], x, y, False, walkable)
 
     def update_tile_walkability(self, pos):
-        x, y, z = pos
-        tcod.map_set_properties(self.path_map[z], x, y, False,
-                                self[pos].is_walkable())
+        """
+        Make the walkability of pos follow its tile. Path maps and
+        everything else built on walkability are updated through
+        Walkability, if it did change.
+        """
+        self.walkability.tile_changed(pos)
 
     def list_tiles_with_objects(self, function, exclusion_list=None):
+        """
+        List the (x, y) coords of all tiles holding an object
+        with the given function.
+        """
         objects_coords = []
-        for idz, column in enumerate(self.tiles):
-            for idy, line in enumerate(column):
-                for idx, tile in enumerate(line):
-                    if tile.has_object_with_function(function):
-                        if exclusion_list and (idx, idy) in exclusion_list:
-                            continue
-                        objects_coords.append((idx, idy))
+        for _, floor in self.store.allocated_floors():
+            ys, xs = np.nonzero(floor.function == function)
+            objects_coords.extend(zip(xs.tolist(), ys.tolist()))
+        if exclusion_list:
+            objects_coords = [c for c in objects_coords
+                              if c not in exclusion_list]
         return objects_coords
 
     def __getitem__(self, pos):
         x, y, z = pos
-        return self.tiles[z][y][x]
-
-
-class Tile(object):
-    def __init__(self, x, y, z, background=0):
-        self.x = x
-        self.y = y
-        self.z = z
-        self.material = None
-        self.wall = False
-        self.built = False
-        self.background = background
-        self.tile_object = None
-        self.room_type = None
-
-    def is_walkable(self):
-        return not self.wall and self.built and\
-            (not self.tile_object or
-             (self.tile_object and not self.tile_object.blocks))
-
-    def has_object_with_function(self, function):
-        return self.tile_object and self.tile_object.function == function
-
-    def is_separating_tile(self):
-        return self.has_object_with_function(Functions.ROOM_SEPARATOR)
-
-    def describe(self):
-        return ''.join([self.describe_nature(),
-                       ' --- ',
-                        self.describe_object()])
-
-    def describe_nature(self):
-        if self.wall:
-            return "Wall"
-        elif not self.built:
-            return "Outside"
-        elif self.room_type is not None:
-            return rooms_to_name[self.room_type]
-        else:
-            return "Empty space"
-
-    def describe_object(self):
-        if self.tile_object:
-            return self.tile_object.name
-        else:
-            return ''
+        return Tile(self.store, x, y, z)
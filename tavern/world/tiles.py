@@ -0,0 +1,321 @@
+'''
+Storage for the tiles of a tavern map.
+
+Tiles are not stored as individual objects. Every property of a tile
+lives in a NumPy array (one array per property and per floor), and
+Tile objects are only lightweight views over one cell of those arrays.
+This keeps huge maps cheap, and lets us answer questions such as
+"where are all the counters ?" with mask operations.
+'''
+import numpy as np
+
+from tavern.world.objects.functions import Functions
+from tavern.world.objects.objects import rooms_to_name
+
+# Value stored in integer layers when a property is not set (None)
+NO_VALUE = -1
+# Object id used when there is no object on a tile
+NO_OBJECT = 0
+# Room id used when a tile is not part of a room
+NO_ROOM = 0
+
+
+# Layers whose changes are reported to watchers
+WATCHED_LAYERS = ('wall', 'built')
+
+
+class TileWatcher(object):
+    """
+    Something that must know when the tiles of a store change.
+    Register it in the watchers list of the store.
+    """
+    def tile_changed(self, pos):
+        """Called after the wall or built property of a tile changed."""
+        pass
+
+    def object_changed(self, pos, previous_function, function):
+        """Called after the object on a tile changed. Functions are
+        NO_VALUE when there was (or there is now) no object."""
+        pass
+
+
+class Floor(object):
+    """The arrays holding the tiles of a single floor."""
+    def __init__(self, width, height):
+        shape = (height, width)
+        self.wall = np.zeros(shape, dtype=bool)
+        self.built = np.zeros(shape, dtype=bool)
+        self.material = np.full(shape, NO_VALUE, dtype=np.int8)
+        self.room_type = np.full(shape, NO_VALUE, dtype=np.int8)
+        # Id of the room each tile belongs to
+        self.room_id = np.full(shape, NO_ROOM, dtype=np.int32)
+        # Objects are kept in the store registry, tiles only know their id
+        self.object_id = np.full(shape, NO_OBJECT, dtype=np.int32)
+        # Those two layers mirror properties of the objects, so that
+        # we can run bulk queries without touching the objects.
+        self.function = np.full(shape, NO_VALUE, dtype=np.int16)
+        self.blocks = np.zeros(shape, dtype=bool)
+
+    def walkable(self):
+        """Return a mask of all walkable tiles of this floor."""
+        return ~self.wall & self.built & ~self.blocks
+
+
+# What a floor that was never written to contains
+FLOOR_DEFAULTS = {'wall': False,
+                  'built': False,
+                  'material': NO_VALUE,
+                  'room_type': NO_VALUE,
+                  'room_id': NO_ROOM,
+                  'object_id': NO_OBJECT,
+                  'function': NO_VALUE,
+                  'blocks': False}
+
+
+class TileStore(object):
+    """
+    Struct-of-arrays storage for all the tiles of a map.
+    Floors are only allocated the first time something is written
+    on them : untouched floors cost nothing.
+    """
+    def __init__(self, width, height, depth, background):
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.floors = [None] * depth
+        # Background is the same for every floor
+        self.background = background
+        self.objects = [None]
+        self.free_ids = []
+        # TileWatchers to warn when tiles change
+        self.watchers = []
+
+    def get_floor(self, z):
+        """Return the arrays of floor z, or None if it was never used."""
+        return self.floors[z]
+
+    def make_floor(self, z):
+        """Return the arrays of floor z, allocating them if needed."""
+        floor = self.floors[z]
+        if floor is None:
+            floor = Floor(self.width, self.height)
+            self.floors[z] = floor
+        return floor
+
+    def allocated_floors(self):
+        """List the (z, floor) of all floors that have been written to."""
+        return [(z, floor) for z, floor in enumerate(self.floors)
+                if floor is not None]
+
+    def get(self, layer, pos):
+        x, y, z = pos
+        floor = self.floors[z]
+        if floor is None:
+            return FLOOR_DEFAULTS[layer]
+        return getattr(floor, layer)[y, x]
+
+    def set(self, layer, pos, value):
+        x, y, z = pos
+        getattr(self.make_floor(z), layer)[y, x] = value
+        if layer in WATCHED_LAYERS:
+            for watcher in self.watchers:
+                watcher.tile_changed(pos)
+
+    def get_object(self, pos):
+        return self.objects[self.get('object_id', pos)]
+
+    def set_object(self, pos, tile_object):
+        x, y, z = pos
+        floor = self.make_floor(z)
+        previous = floor.object_id[y, x]
+        previous_function = int(floor.function[y, x])
+        if previous != NO_OBJECT:
+            self.objects[previous] = None
+            self.free_ids.append(previous)
+        if tile_object is None:
+            floor.object_id[y, x] = NO_OBJECT
+            floor.function[y, x] = NO_VALUE
+            floor.blocks[y, x] = False
+        else:
+            if self.free_ids:
+                object_id = self.free_ids.pop()
+                self.objects[object_id] = tile_object
+            else:
+                object_id = len(self.objects)
+                self.objects.append(tile_object)
+            floor.object_id[y, x] = object_id
+            # Goods displayed in storage do not have a function
+            floor.function[y, x] = getattr(tile_object, 'function',
+                                           NO_VALUE)
+            floor.blocks[y, x] = bool(tile_object.blocks)
+        for watcher in self.watchers:
+            watcher.object_changed(pos, previous_function,
+                                   int(floor.function[y, x]))
+
+    def is_walkable(self, pos):
+        x, y, z = pos
+        floor = self.floors[z]
+        return floor is not None and bool(
+            not floor.wall[y, x] and floor.built[y, x] and
+            not floor.blocks[y, x])
+
+
+class Tile(object):
+    """A view over one cell of a TileStore."""
+    __slots__ = ('store', 'x', 'y', 'z')
+
+    def __init__(self, store, x, y, z):
+        self.store = store
+        self.x = x
+        self.y = y
+        self.z = z
+
+    @property
+    def wall(self):
+        return bool(self.store.get('wall', (self.x, self.y, self.z)))
+
+    @wall.setter
+    def wall(self, value):
+        self.store.set('wall', (self.x, self.y, self.z), value)
+
+    @property
+    def built(self):
+        return bool(self.store.get('built', (self.x, self.y, self.z)))
+
+    @built.setter
+    def built(self, value):
+        self.store.set('built', (self.x, self.y, self.z), value)
+
+    @property
+    def material(self):
+        material = self.store.get('material', (self.x, self.y, self.z))
+        if material == NO_VALUE:
+            return None
+        return int(material)
+
+    @material.setter
+    def material(self, value):
+        if value is None:
+            value = NO_VALUE
+        self.store.set('material', (self.x, self.y, self.z), value)
+
+    @property
+    def room_type(self):
+        room_type = self.store.get('room_type', (self.x, self.y, self.z))
+        if room_type == NO_VALUE:
+            return None
+        return int(room_type)
+
+    @room_type.setter
+    def room_type(self, value):
+        if value is None:
+            value = NO_VALUE
+        self.store.set('room_type', (self.x, self.y, self.z), value)
+
+    @property
+    def background(self):
+        return float(self.store.background[self.y, self.x])
+
+    @property
+    def tile_object(self):
+        return self.store.get_object((self.x, self.y, self.z))
+
+    @tile_object.setter
+    def tile_object(self, value):
+        self.store.set_object((self.x, self.y, self.z), value)
+
+    def is_walkable(self):
+        return self.store.is_walkable((self.x, self.y, self.z))
+
+    def has_object_with_function(self, function):
+        return bool(self.store.get('function', (self.x, self.y, self.z)) ==
+                    function)
+
+    def is_separating_tile(self):
+        return self.has_object_with_function(Functions.ROOM_SEPARATOR)
+
+    def describe(self):
+        return ''.join([self.describe_nature(),
+                       ' --- ',
+                        self.describe_object()])
+
+    def describe_nature(self):
+        if self.wall:
+            return "Wall"
+        elif not self.built:
+            return "Outside"
+        elif self.room_type is not None:
+            return rooms_to_name[self.room_type]
+        else:
+            return "Empty space"
+
+    def describe_object(self):
+        tile_object = self.tile_object
+        if tile_object:
+            return tile_object.name
+        else:
+            return ''
+
+
+class _GridView(object):
+    """
+    Base for the nested views that let callers index tiles
+    the old way, with tiles[z][y][x].
+    """
+    def __len__(self):
+        raise NotImplementedError('_GridView is an abstract class !')
+
+    def item(self, index):
+        raise NotImplementedError('_GridView is an abstract class !')
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        return self.item(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.item(index)
+
+
+class TileGrid(_GridView):
+    """All floors of a store : tiles[z]."""
+    def __init__(self, store):
+        self.store = store
+
+    def __len__(self):
+        return self.store.depth
+
+    def item(self, z):
+        return FloorView(self.store, z)
+
+
+class FloorView(_GridView):
+    """One floor of a store : tiles[z][y]."""
+    def __init__(self, store, z):
+        self.store = store
+        self.z = z
+
+    def __len__(self):
+        return self.store.height
+
+    def item(self, y):
+        return RowView(self.store, y, self.z)
+
+
+class RowView(_GridView):
+    """One line of a floor : tiles[z][y][x]."""
+    def __init__(self, store, y, z):
+        self.store = store
+        self.y = y
+        self.z = z
+
+    def __len__(self):
+        return self.store.width
+
+    def item(self, x):
+        return Tile(self.store, x, self.y, self.z)
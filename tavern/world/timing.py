@@ -0,0 +1,77 @@
+'''
+A timing wheel, so that creatures with nothing to do for a known number
+of ticks (sleeping, eating, waiting for their meal...) are not ticked
+at all until they wake up.
+
+Tasks tell how many of their coming ticks would only count time (see
+Task.idle_ticks). The world then puts their creature to sleep in the
+wheel, and when it wakes up, its task is told how many ticks it missed
+(see Task.skip), so that it goes on just as if it had been ticked.
+'''
+
+# Number of slots of the wheel. Creatures sleeping longer than this
+# wait in their slot for the right turn of the wheel.
+WHEEL_SIZE = 256
+
+
+class TimingWheel(object):
+    """
+    Sleeping creatures, in a slot per tick of wake-up (modulo the size
+    of the wheel). A creature can be woken up before its time, if
+    someone changes its situation (e.g. serves its meal).
+    """
+    def __init__(self, size=WHEEL_SIZE):
+        self.now = 0
+        # (tick of wake-up, creature), by slot
+        self.slots = [[] for _ in range(size)]
+        # creature -> (tick it was last ticked, tick of wake-up)
+        self.asleep = {}
+        # creature -> (tick it was last ticked, tick it woke up), for
+        # creatures that were not ticked since they woke up.
+        self.woken = {}
+
+    def sleep(self, creature, ticks):
+        """Skip the next [ticks] ticks of creature."""
+        wake_up = self.now + ticks + 1
+        self.asleep[creature] = (self.now, wake_up)
+        self.slots[wake_up % len(self.slots)].append((wake_up, creature))
+        creature.timers = self
+
+    def wake(self, creature):
+        entry = self.asleep.pop(creature, None)
+        if entry is not None:
+            self.woken[creature] = (entry[0], self.now)
+            creature.timers = None
+
+    def is_asleep(self, creature):
+        return creature in self.asleep
+
+    def advance(self):
+        """Go to the next tick, and wake up the creatures due."""
+        self.now += 1
+        index = self.now % len(self.slots)
+        waiting = []
+        for wake_up, creature in self.slots[index]:
+            if wake_up > self.now:
+                waiting.append((wake_up, creature))
+            elif self.asleep.get(creature, (None, None))[1] == wake_up:
+                self.wake(creature)
+        self.slots[index] = waiting
+        # Creatures woken up, and not ticked since a whole tick,
+        # are not in the world anymore.
+        for creature, (_, woke_up) in list(self.woken.items()):
+            if woke_up < self.now - 1:
+                del self.woken[creature]
+
+    def catch_up(self, creature):
+        """
+        Return the number of ticks a creature about to be ticked missed
+        while sleeping (0 if it was not).
+        """
+        entry = self.woken.pop(creature, None)
+        if entry is None:
+            return 0
+        return self.now - entry[0] - 1
+
+    def __len__(self):
+        return len(self.asleep)
@@ -1,4 +1,5 @@
 from tavern.events.events import CUSTOMER_EVENT
+from tavern.world.timing import TimingWheel
 from groggy.events import bus
 
 
@@ -18,10 +19,64 @@ class World(object):
         self.tavern = tavern
         self.goods = goods
         self.jobs = jobs
+        # Creatures with nothing to do for a while sleep in there
+        self.timers = TimingWheel()
+        # Commands given by creatures during a tick, applied at its end
+        self.commands = None
 
     def tick(self):
+        # Walking costs take the crowd into account, when searches use
+        # them : the table stays changed till then.
+        table = self.tavern.table
+        if table.changed and self.tavern_map.backend.uses_costs:
+            table.changed = False
+            self.tavern_map.costs.update_occupancy(*table.occupancy())
+        self.commands = []
+        try:
+            self.decide()
+        finally:
+            commands = self.commands
+            self.commands = None
+        self.apply(commands)
+        cooperation = self.tavern_map.cooperation
+        if cooperation is not None:
+            cooperation.advance(self.tavern.creatures)
+
+    def decide(self):
+        """
+        Tick creatures. The commands they give (reserving a seat,
+        ordering, adding a task...) are kept for the apply phase : every
+        creature decides on the world as it was at the start of the
+        tick, whatever the ones ticked before it did.
+        """
+        timers = self.timers
+        timers.advance()
         for crea in self.tavern.creatures:
+            if timers.is_asleep(crea):
+                continue
+            missed = timers.catch_up(crea)
+            if missed:
+                crea.skip(missed)
             crea.tick(self)
+            idle = crea.idle_ticks()
+            if idle:
+                timers.sleep(crea, idle)
+        path_requests = self.tavern_map.path_requests
+        if path_requests is not None:
+            # Search requested paths. Walkers that get theirs right
+            # away use it in the same tick.
+            for crea in path_requests.flush():
+                crea.tick(self)
+
+    def apply(self, commands):
+        """
+        Execute the commands of a tick, in the order they were given.
+        Conflicts are solved there : when two creatures reserved the
+        same seat, the first one gets it, and the plans of the other
+        one fail (see ReserveService).
+        """
+        for command in commands:
+            command.execute(self)
 
     def receive(self, event):
         event_data = event.get('data')
@@ -29,7 +84,10 @@ class World(object):
             self.tavern.handle_customer_event(event_data)
         elif event.get('type') == bus.WORLD_EVENT:
             command = event_data.get('command')
-            if command:
+            if command and self.commands is not None:
+                # Creatures are deciding : see decide
+                self.commands.append(command)
+            elif command:
                 command.execute(self)
 
     # For now, we will redefine common Tavern
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from collections import defaultdict
 
@@ -14,6 +16,10 @@ from tavern.world.map_commands import BuildCommand, PutCommand, RoomCommand
 from tavern.world.actions import door, counter, chair, oven, work_station
 from tavern.people.employees import WAITER
 
+# Keep the backgrounds of the maps built by tests out of the user's cache
+BACKGROUND_CACHE = tempfile.TemporaryDirectory()
+os.environ['TAVERN_CACHE'] = BACKGROUND_CACHE.name
+
 
 class TavernTest(unittest.TestCase):
     TEST_WORLD_WIDTH = 100
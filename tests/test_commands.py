@@ -3,7 +3,10 @@ from tavern.events.events import STATUS_EVENT
 from tavern.people.characters import Patron
 from tavern.people.needs import Needs
 from tavern.world.objects.functions import Functions
-from tavern.world.objects.defaults import chair
+from tavern.world.objects.defaults import chair, bed
+from tavern.world.objects.objects import Rooms
+from tavern.world.map_commands import RoomCommand
+from tavern.people.tasks.patron import ReserveService
 from tavern.world.commands import AttendToCommand, OrderCommand, CreatureExit
 from tavern.world.commands import BuyCommand, ReserveCommand
 
@@ -154,3 +157,45 @@ class TestReserveSeat(TavernTest):
         self.assertNotIn((self.chair_pos), busy_seatings)
         free_seatings = self.tavern_map.available_services[Functions.SITTING]
         self.assertIn((self.chair_pos), free_seatings)
+
+    def test_double_reservation(self):
+        """Reserving a seat that was already taken should fail the
+        task asking for it."""
+        self.chair_pos = (self.CHAIR_X, self.CHAIR_Y, 0)
+        self.add_object(chair, self.CHAIR_X, self.CHAIR_Y)
+        first = ReserveService(self.chair_pos, Functions.SITTING)
+        second = ReserveService(self.chair_pos, Functions.SITTING)
+        first.finish()
+        second.finish()
+        self.assertFalse(first.failed)
+        self.assertTrue(second.failed)
+        seatings = self.tavern_map.used_services[Functions.SITTING]
+        self.assertEqual(list(seatings), [self.chair_pos])
+
+
+class TestRooms(TavernTest):
+    def test_room_at(self):
+        """Rooms defined by the player should be found from any of
+        their tiles, and know the objects they contain."""
+        storage = self.tavern_map.room_at((3, 3, 0))
+        self.assertEqual(storage.room_type, Rooms.STORAGE)
+        tavern_room = self.tavern_map.room_at((10, 10, 0))
+        self.assertEqual(tavern_room.room_type, Rooms.TAVERN)
+        self.assertIn((12, 12, 0), tavern_room)
+        self.assertEqual(tavern_room.bounding_box, (9, 2, 12, 12))
+        self.assertEqual(tavern_room.count_objects(Functions.ORDERING), 1)
+        self.assertIsNone(self.tavern_map.room_at((30, 30, 0)))
+        self.assertEqual(self.tavern_map.get_room_at((30, 30, 0)),
+                         (None, None))
+
+    def test_only_one_bed_per_room(self):
+        """A room can only hold one bed."""
+        self.call_command(RoomCommand(self.tavern_map.fill_from((3, 3, 0)),
+                                      Rooms.ROOM))
+        # The storage was entirely redefined as an inn room
+        self.assertEqual(self.tavern_map.rooms[Rooms.STORAGE], [])
+        self.add_object(bed, 3, 3)
+        self.add_object(bed, 4, 4)
+        room = self.tavern_map.room_at((3, 3, 0))
+        self.assertEqual(room.count_objects(Functions.SLEEPING), 1)
+        self.assertIsNone(self.tavern_map[(4, 4, 0)].tile_object)
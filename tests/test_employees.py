@@ -1,9 +1,13 @@
 from tests import TavernTest
 from tavern.people.tasks.employee import (
     Serving, TakeOrder, FollowProcess, HaveSomethingDelivered,
-    DeliverTask
+    DeliverTask, CookFood
 )
+from tavern.people.tasks.tasks import Waiting
+from tavern.world.goods import meat_preparation
 from tavern.people.employees import COOK, WAITER
+from tavern.world.commands import AddTask
+from tavern.world.objects.functions import Functions
 
 
 class TestEmployees(TavernTest):
@@ -45,7 +49,7 @@ class TestEmployees(TavernTest):
     def test_cook_order(self):
         """If a hungry patron has ordered food, employees should
         go, prepare it."""
-        waiter = self._make_employee(WAITER)
+        self._make_employee(WAITER)
         cook = self._make_employee(COOK)
 
         self.base_conditions()
@@ -56,4 +60,42 @@ class TestEmployees(TavernTest):
 
         self.assertCanTickTillTaskIs(cook, FollowProcess, 280)
         self.assertCanTickTillTaskIs(cook, HaveSomethingDelivered, 80)
-        self.assertCanTickTillTaskIs(waiter, DeliverTask, 200)
+        # Any waiter can deliver it : the publican, or the one
+        # hired, whichever is free first.
+
+        def meal_is_delivered():
+            return any(isinstance(crea.current_activity, DeliverTask)
+                       for crea in self.tavern.creatures)
+
+        self.assertCanTickTill(meal_is_delivered, 200,
+                               'Nobody picked up the meal.')
+
+    def test_idle_employee_waits_for_tasks(self):
+        """Employees with nothing to do are not ticked till a task
+        they can do is added."""
+        cook = self._make_employee(COOK)
+        self.tick_for(2)
+        self.assertIsInstance(cook.current_activity, Waiting)
+        self.assertTrue(self.world.timers.is_asleep(cook))
+        # Orders are not for cooks
+        self.call_command(AddTask(Functions.ORDER_TAKING, None, CookFood()))
+        self.assertTrue(self.world.timers.is_asleep(cook))
+        self.call_command(AddTask(Functions.COOKING, None, CookFood()))
+        self.assertFalse(self.world.timers.is_asleep(cook))
+        self.assertCanTickTillTaskIs(cook, CookFood, 2)
+
+    def test_cook_without_ingredients(self):
+        """A cook missing ingredients for a process should give up on
+        it the next tick, not once the process would be over."""
+        cook = self._make_employee(COOK)
+        cook.fail_activities()
+        process = FollowProcess(meat_preparation)
+        cook.add_activity(process)
+        self.tick_for()
+        self.assertTrue(process.failed)
+        self.assertIsNot(cook.current_activity, process)
+        self.assertFalse(self.world.timers.is_asleep(cook))
+        self.assertEqual(cook.idle_ticks(), 0)
+        self.tick_for()
+        self.assertIsNotNone(cook.current_activity)
+        self.assertIsNot(cook.current_activity, process)
@@ -0,0 +1,43 @@
+import unittest
+from collections import defaultdict
+
+import groggy.events.bus as bus
+
+from tavern.headless import HeadlessGame, main
+
+
+class TestHeadless(unittest.TestCase):
+    def tearDown(self):
+        # Reset the bus
+        bus.bus.events = defaultdict(list)
+
+    def test_run_headless(self):
+        """A tavern should be built from the layout, and run with no
+        display at all."""
+        game = HeadlessGame(60, 60)
+        self.assertTrue(game.tavern.tavern_map.rooms)
+        self.assertEqual(len(game.tavern.creatures), 1)
+        rate = game.run(300)
+        self.assertGreater(rate, 0)
+        self.assertEqual(game.ticks, 300)
+        # Customers come once the tavern is open
+        self.assertTrue(game.customers.can_receive())
+
+    def test_main(self):
+        """The runner should report its tick rate."""
+        rate = main(['--ticks', '50', '--width', '40', '--height', '40',
+                     '--seed', '1', '--backend', 'jps'])
+        self.assertGreater(rate, 0)
+
+    def test_games_in_sequence(self):
+        """A closed game should not listen to the bus anymore, so that
+        another one can be run in the same process."""
+        for seed in (1, 2):
+            main(['--ticks', '50', '--width', '40', '--height', '40',
+                  '--seed', str(seed)])
+        self.assertFalse(bus.bus.events[bus.WORLD_EVENT])
+        game = HeadlessGame(40, 40)
+        game.close()
+        game = HeadlessGame(40, 40)
+        self.assertGreater(game.run(50), 0)
+        self.assertEqual(bus.bus.events[bus.WORLD_EVENT], [game.world])
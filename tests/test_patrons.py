@@ -1,6 +1,7 @@
 from tests import TavernTest
+from tavern.people.tasks.tasks import Task
 from tavern.people.tasks.patron import (
-    Ordering, Leaving, Drinking, Eating, TableOrder)
+    Ordering, Leaving, Drinking, Eating, TableOrder, ReserveService)
 from tavern.world.objects.functions import Functions
 from tavern.people.employees import COOK, WAITER
 
@@ -17,6 +18,19 @@ class TestPatron(TavernTest):
         # Here, since we do not have drinks to give him, he should leave
         self.assertCanTickTillTaskIs(patron, Leaving, 50)
 
+    def test_ordering_unsubscribes(self):
+        """Customers stop waiting for a counter to open once they are
+        done ordering, whatever the way it ended."""
+        subscriptions = self.tavern_map.services.subscriptions
+        for end in ('fail', 'finish'):
+            patron = self._build_thirsty_customer()
+            ordering = Ordering()
+            ordering.tick(self.tavern_map, patron)
+            self.assertIn(patron, subscriptions.waiting[Functions.ORDERING])
+            getattr(ordering, end)()
+            self.assertNotIn(patron,
+                             subscriptions.waiting[Functions.ORDERING])
+
     def test_order_sit_drink_leave(self):
         """Thirsty patrons will order a drink and, if they get one,
         go to a chair to drink it. They will then leave."""
@@ -92,3 +106,57 @@ class TestPatron(TavernTest):
         for n in range(0, 30):
             self._build_thirsty_customer()
         self.tick_for(15000)
+
+    def test_idle_patrons_are_not_ticked(self):
+        """Drinking patrons are left alone till they are done, and catch
+        up with the ticks they missed if they are woken up earlier."""
+        patron = self._build_thirsty_customer()
+        self.add_drinks()
+        self.add_chair()
+        self.assertCanTickTillTaskIs(patron, Drinking, 40)
+        drinking = patron.current_activity
+        self.tick_for(5)
+        self.assertTrue(self.world.timers.is_asleep(patron))
+        self.assertLess(drinking.tick_time, 5)
+        patron.wake_up()
+        self.assertFalse(self.world.timers.is_asleep(patron))
+        self.tick_for()
+        self.assertEqual(6, drinking.tick_time)
+        # Patron then drinks as long as if it was ticked every time
+        self.tick_for(drinking.length - drinking.tick_time)
+        self.assertIs(drinking, patron.current_activity)
+        self.tick_for()
+        self.assertTrue(drinking.finished)
+
+    def test_same_seat_reserved_twice(self):
+        """Two patrons reserving the same seat in the same tick : the
+        first one ticked gets it, the plans of the other one fail."""
+        self.add_chair()
+        seat = (9, 6, 0)
+        first = self._build_thirsty_customer()
+        second = self._build_thirsty_customer()
+        reservations = []
+        for patron in (first, second):
+            reservation = ReserveService(seat, Functions.SITTING)
+            reservations.append(reservation)
+            patron.add_activities([reservation, Drinking()])
+
+        class LookAtSeat(Task):
+            def tick(self, world_map, creature):
+                self.free = world_map.can_serve_at(Functions.SITTING, seat)
+                self.finish()
+
+        # Reservations are applied at the end of the tick
+        looking = LookAtSeat()
+        self._build_thirsty_customer().add_activity(looking)
+        self.tick_for()
+        self.assertTrue(looking.free)
+        self.assertIn(seat, self.tavern_map.used_services[Functions.SITTING])
+        self.assertNotIn(seat,
+                         self.tavern_map.available_services[
+                             Functions.SITTING])
+        self.assertFalse(reservations[0].failed)
+        self.assertIsInstance(first.current_activity, Drinking)
+        self.assertTrue(reservations[1].failed)
+        self.assertIsNone(second.current_activity)
+        self.assertEqual(second.activity_list, [])
@@ -1,6 +1,12 @@
+import os
+import tempfile
+
 from tests import TavernTest
+from tavern.world import background
 from tavern.world.objects.functions import Functions
-from tavern.world.actions import chair
+from tavern.world.actions import chair, door, stairs
+from tavern.world.map_commands import BuildCommand, PutCommand
+from tavern.people.tasks.tasks import ImpossibleTask, Walking
 
 
 class TestWorld(TavernTest):
@@ -38,3 +44,567 @@ class TestWorld(TavernTest):
             1,
             'The new tavern should now have one available service.'
         )
+
+    def test_tiles_are_views_on_the_map(self):
+        """Tiles obtained from the map should write through to the map
+        storage, whichever way they are accessed."""
+        tile = self.tavern_map[(20, 30, 0)]
+        self.assertFalse(tile.is_walkable())
+        tile.built = True
+        self.assertTrue(self.tavern_map.tiles[0][30][20].built)
+        self.assertTrue(self.tavern_map[(20, 30, 0)].is_walkable())
+        self.tavern_map[(20, 30, 0)].tile_object = chair
+        self.assertTrue(tile.has_object_with_function(Functions.SITTING))
+        self.assertEqual(tile.describe(), 'Empty space --- Chair')
+
+    def test_list_tiles_with_objects(self):
+        """Listing tiles with a given function should find the counter
+        put in the tavern."""
+        counter_coords = (TavernTest.COUNTER_X, TavernTest.COUNTER_Y)
+        self.assertEqual(
+            self.tavern_map.list_tiles_with_objects(Functions.ORDERING),
+            [counter_coords])
+        self.assertEqual(
+            self.tavern_map.list_tiles_with_objects(Functions.ORDERING,
+                                                    [counter_coords]),
+            [])
+
+    def test_untouched_floors_are_not_allocated(self):
+        """Only the ground floor is used by the tavern : upper floors
+        should neither have tiles nor path maps."""
+        self.tick_for(10)
+        self.assertIsNotNone(self.tavern_map.store.get_floor(0))
+        self.assertIsNotNone(self.tavern_map.path_maps[0])
+        for z in range(1, 10):
+            self.assertIsNone(self.tavern_map.store.get_floor(z))
+            self.assertIsNone(self.tavern_map.path_maps[z])
+        # Reading an untouched floor should not allocate it either
+        self.assertFalse(self.tavern_map[(5, 5, 3)].is_walkable())
+        self.assertIsNone(self.tavern_map.store.get_floor(3))
+
+    def test_background_is_cached(self):
+        """The background noise should be computed once, then read
+        from the cache for the same seed and dimensions."""
+        with tempfile.TemporaryDirectory() as cache:
+            first = background.make_background(30, 20, 7, cache)
+            self.assertEqual(first.shape, (20, 30))
+            self.assertTrue(((first >= -1) & (first < 1)).all())
+            self.assertEqual(len(os.listdir(cache)), 1)
+            turbulence = background.turbulence
+            try:
+                background.turbulence = None
+                second = background.make_background(30, 20, 7, cache)
+            finally:
+                background.turbulence = turbulence
+            self.assertTrue((first == second).all())
+            background.make_background(30, 20, 8, cache)
+            self.assertEqual(len(os.listdir(cache)), 2)
+
+    def test_fill_from_follows_map_changes(self):
+        """Architectural units should stop at walls and doors, and be
+        updated when a new door cuts one of them."""
+        storage = self.tavern_map.fill_from((3, 3, 0))
+        # The storage area and the corridor up to the first door
+        self.assertEqual(len(storage), 20)
+        self.assertIn((7, 4, 0), storage)
+        self.assertEqual(self.tavern_map.fill_from((7, 4, 0)), storage)
+        self.assertEqual(self.tavern_map.fill_from((8, 4, 0)), [])
+        self.call_command(PutCommand(self._build_area(6, 3, 0, 6, 4), door))
+        self.assertEqual(len(self.tavern_map.fill_from((3, 3, 0))), 16)
+        self.assertEqual(self.tavern_map.fill_from((7, 4, 0)),
+                         [(7, 3, 0), (7, 4, 0)])
+
+    def test_closest_service(self):
+        """The closest available service should be found, and stop
+        being found once taken."""
+        services = self.tavern_map.available_services[Functions.SITTING]
+        for pos in [(3, 3, 0), (40, 40, 0), (11, 4, 0), (11, 4, 0)]:
+            self.tavern_map.open_service(Functions.SITTING, pos)
+        self.assertEqual(len(services), 4)
+        find = self.tavern_map.find_closest_object
+        self.assertEqual(find((10, 10, 0), Functions.SITTING), (11, 4, 0))
+        self.assertEqual(find((35, 30, 0), Functions.SITTING), (40, 40, 0))
+        self.tavern_map.take_service(Functions.SITTING, (11, 4, 0))
+        self.assertEqual(find((10, 10, 0), Functions.SITTING), (11, 4, 0))
+        self.tavern_map.take_service(Functions.SITTING, (11, 4, 0))
+        self.assertEqual(find((10, 10, 0), Functions.SITTING), (3, 3, 0))
+        self.assertIsNone(find((10, 10, 0), Functions.EATING))
+
+    def test_closest_reachable_service(self):
+        """Patrons should be led to the closest service they can walk
+        to, not to the closest one as the crow flies."""
+        self.add_object(chair, 3, 3)
+        # Outside of the tavern : closer, but out of reach
+        self.tavern_map.open_service(Functions.SITTING, (20, 10, 0))
+        find = self.tavern_map.find_closest_reachable
+        self.assertEqual(
+            self.tavern_map.find_closest_object((10, 10, 0),
+                                                Functions.SITTING),
+            (20, 10, 0))
+        pos, path = find((10, 10, 0), Functions.SITTING)
+        self.assertEqual(pos, (3, 3, 0))
+        self.assertEqual(path[-1], (3, 3, 0))
+        self.assertEqual(len(path),
+                         len(self.tavern_map.path_from_to((10, 10, 0),
+                                                          (3, 3, 0))))
+        # Taking the service should update the field
+        self.tavern_map.take_service(Functions.SITTING, (3, 3, 0))
+        self.assertEqual(find((10, 10, 0), Functions.SITTING), (None, None))
+
+    def test_paths_are_cached(self):
+        """Paths should be computed once, then given by the cache until
+        a tile on their route changes."""
+        cache = self.tavern_map.path_cache
+        path = self.tavern_map.path_from_to((2, 2, 0), (7, 4, 0))
+        self.assertEqual(path[-1], (7, 4, 0))
+        self.assertEqual(self.tavern_map.path_from_to((2, 2, 0),
+                                                      (7, 4, 0)), path)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Something unrelated to the route changes
+        self.add_object(chair, 10, 10)
+        self.tavern_map.path_from_to((2, 2, 0), (7, 4, 0))
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        # Block the route
+        blocked = path[len(path) // 2]
+        self.tavern_map[blocked].wall = True
+        new_path = self.tavern_map.path_from_to((2, 2, 0), (7, 4, 0))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+        self.assertNotIn(blocked, new_path)
+        # Unreachable destinations do not even reach the cache
+        self.assertEqual(self.tavern_map.path_from_to((2, 2, 0),
+                                                      (20, 20, 0)), [])
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_paths_through_doors(self):
+        """Walks between units should be planned from door to door, and
+        be as short as the ones found on the whole grid."""
+        tavern_map = self.tavern_map
+        for origin, destination in [((3, 3, 0), (12, 12, 0)),
+                                    ((12, 12, 0), (2, 5, 0)),
+                                    ((8, 4, 0), (2, 2, 0)),
+                                    ((10, 3, 0), (8, 3, 0))]:
+            path = tavern_map.planner.path(origin, destination)
+            plain = tavern_map._compute_path(origin, destination)
+            self.assertEqual(path[-1], destination)
+            self.assertEqual(len(path), len(plain))
+            previous = origin
+            for x, y, z in path:
+                self.assertLessEqual(max(abs(x - previous[0]),
+                                         abs(y - previous[1])), 1)
+                self.assertTrue(tavern_map[(x, y, z)].is_walkable())
+                previous = (x, y)
+        # Door to door costs come from searches limited to units :
+        # only the segments of the chosen route are searched on the grid.
+        tavern_map.path_cache.clear()
+        searches = []
+        search = tavern_map.backend.search
+        tavern_map.backend.search = lambda *ends: searches.append(ends) or\
+            search(*ends)
+        doors = [step for step in tavern_map.planner.path((3, 3, 0),
+                                                          (12, 12, 0))
+                 if tavern_map[step].has_object_with_function(
+                     Functions.ROOM_SEPARATOR)]
+        self.assertLessEqual(len(searches), len(doors) + 1)
+        tavern_map.backend.search = search
+        # Walks in a single unit are left to a plain search
+        self.assertIsNone(tavern_map.planner.path((2, 2, 0), (7, 4, 0)))
+        # Closing the way with a wall on the doors
+        for y in (3, 4):
+            tavern_map[(8, y, 0)].wall = True
+        self.assertIsNone(tavern_map.planner.path((3, 3, 0), (12, 12, 0)))
+        self.assertEqual(tavern_map.path_from_to((3, 3, 0), (12, 12, 0)), [])
+
+    def test_reachability(self):
+        """Reaching a tile should be known without searching, and follow
+        the changes of the map."""
+        tavern_map = self.tavern_map
+        self.assertTrue(tavern_map.can_reach((3, 3, 0), (12, 12, 0)))
+        self.assertFalse(tavern_map.can_reach((3, 3, 0), (20, 20, 0)))
+        self.assertFalse(tavern_map.can_reach((3, 3, 0), (3, 3, 1)))
+        # Seal the storage
+        for y in (3, 4):
+            tavern_map[(6, y, 0)].wall = True
+        self.assertFalse(tavern_map.can_reach((3, 3, 0), (12, 12, 0)))
+        self.assertEqual(tavern_map.path_from_to((3, 3, 0), (12, 12, 0)), [])
+        patron = self._build_thirsty_customer()
+        patron.x, patron.y = 3, 3
+        with self.assertRaises(ImpossibleTask):
+            Walking(tavern_map, patron, (12, 12, 0))
+        # And open it again
+        tavern_map[(6, 4, 0)].wall = False
+        self.assertTrue(tavern_map.can_reach((3, 3, 0), (12, 12, 0)))
+        # Standing on a tile that is no longer walkable
+        tavern_map[(3, 2, 0)].wall = True
+        self.assertTrue(tavern_map.can_reach((3, 2, 0), (12, 12, 0)))
+
+    def test_paths_between_floors(self):
+        """Walks to another floor should go through stairs put right
+        above one another."""
+        tavern_map = self.tavern_map
+        self.call_command(BuildCommand(self._build_area(2, 2, 1, 6, 6)))
+        self.assertFalse(tavern_map.can_reach((12, 12, 0), (6, 6, 1)))
+        self.call_command(PutCommand(self._build_area(2, 5), stairs))
+        self.call_command(PutCommand(self._build_area(2, 5, 1), stairs))
+        self.assertTrue(tavern_map.can_reach((12, 12, 0), (6, 6, 1)))
+        path = tavern_map.path_from_to((12, 12, 0), (6, 6, 1))
+        self.assertEqual(path[-1], (6, 6, 1))
+        self.assertIn((2, 5, 0), path)
+        self.assertEqual(path[path.index((2, 5, 0)) + 1], (2, 5, 1))
+        # The upper floor is walled off from the stairs
+        for x, y in [(3, 4), (3, 5), (3, 6), (2, 4), (2, 6)]:
+            tavern_map[(x, y, 1)].wall = True
+        self.assertFalse(tavern_map.can_reach((12, 12, 0), (6, 6, 1)))
+        self.assertEqual(tavern_map.path_from_to((12, 12, 0), (6, 6, 1)), [])
+        # Walkers follow the floors of their path
+        tavern_map[(3, 5, 1)].wall = False
+        patron = self._build_thirsty_customer()
+        patron.move((12, 12, 0))
+        walking = Walking(tavern_map, patron, (6, 6, 1))
+        while not walking.finished:
+            walking.tick(tavern_map, patron)
+        self.assertEqual(patron.to_pos(), (6, 6, 1))
+
+    def test_path_repair(self):
+        """Walkers should go around a new obstacle on their path without
+        computing their whole path again."""
+        tavern_map = self.tavern_map
+        patron = self._build_thirsty_customer()
+        patron.move((3, 3, 0))
+        walking = Walking(tavern_map, patron, (12, 12, 0))
+        walking.tick(tavern_map, patron)
+        walking.tick(tavern_map, patron)
+        blocked = walking.path[walking.tick_time]
+        tavern_map[blocked].wall = True
+        misses = tavern_map.path_cache.misses
+        walking.tick(tavern_map, patron)
+        self.assertEqual(tavern_map.path_cache.misses, misses)
+        self.assertNotEqual(patron.to_pos(), blocked)
+        while not walking.finished:
+            walking.tick(tavern_map, patron)
+            self.assertTrue(tavern_map[patron.to_pos()].is_walkable())
+        self.assertEqual(patron.to_pos(), (12, 12, 0))
+        # Without any way around, the walk is computed again, and
+        # fails if there is no way at all.
+        tavern_map[blocked].wall = False
+        patron.move((3, 3, 0))
+        walking = Walking(tavern_map, patron, (7, 4, 0))
+        walking.tick(tavern_map, patron)
+        for y in range(2, 6):
+            tavern_map[(5, y, 0)].wall = True
+        walking.tick(tavern_map, patron)
+        self.assertTrue(walking.failed)
+        self.assertEqual(patron.to_pos(), (4, 3, 0))
+
+    def test_paths_are_compact(self):
+        """Searches should reuse the same tcod path object, and give it
+        back as soon as the path is copied."""
+        tavern_map = self.tavern_map
+        pool = tavern_map.path_pool
+        patron = self._build_thirsty_customer()
+        patron.move((3, 3, 0))
+        walking = Walking(tavern_map, patron, (12, 12, 0))
+        walking.tick(tavern_map, patron)
+        self.assertEqual(pool.outstanding, 0)
+        for destination in [(10, 3, 0), (2, 5, 0), (4, 4, 0)]:
+            tavern_map.path_from_to((3, 3, 0), destination)
+        self.assertEqual(pool.created, 1)
+        self.assertEqual(pool.outstanding, 0)
+        path = tavern_map.path_from_to((3, 3, 0), (12, 12, 0))
+        self.assertEqual(path.coords.itemsize, 2)
+        self.assertEqual(len(path.coords), 3 * len(path))
+        self.assertEqual(list(path[1:3]), [path[1], path[2]])
+        self.assertEqual(path[:2] + path[2:], path)
+
+    def test_batch_pathfinding(self):
+        """With batching, walkers should get their path from the searches
+        run together at the end of the tick, and walk in the same tick."""
+        tavern_map = self.tavern_map
+        tavern_map.use_batch_pathfinding(2)
+        batch = tavern_map.path_requests
+        self.addCleanup(batch.close)
+        walkers = []
+        for destination in [(12, 12, 0), (9, 9, 0), (12, 12, 0)]:
+            patron = self._build_thirsty_customer()
+            patron.move((10, 3, 0))
+            patron.current_activity = Walking(tavern_map, patron,
+                                              destination)
+            walkers.append((patron, destination))
+        # Walks through doors are planned on the main thread
+        self.assertFalse(batch.handles((3, 3, 0), (12, 12, 0)))
+        self.tick_for()
+        self.assertEqual(batch.searches, 2)
+        self.assertEqual(batch.pending(), 0)
+        # Same walks are only searched once
+        self.assertIs(walkers[0][0].current_activity.path,
+                      walkers[2][0].current_activity.path)
+        for patron, destination in walkers:
+            self.assertNotEqual(patron.to_pos(), (10, 3, 0))
+            path = patron.current_activity.path
+            self.assertEqual(path, tavern_map._compute_path((10, 3, 0),
+                                                            destination))
+        walks = [patron.current_activity for patron, _ in walkers]
+        self.assertCanTickTill(lambda: all(w.finished for w in walks), 20)
+        self.assertFalse(any(w.failed for w in walks))
+        # Copies of the tcod maps made by the threads are freed
+        self.assertTrue(batch.allocated)
+        batch.close()
+        self.assertEqual(batch.allocated, [])
+
+    def test_async_pathfinding(self):
+        """In async mode, walkers should plan while their searches are
+        made, a few per tick, the others being carried over."""
+        tavern_map = self.tavern_map
+        tavern_map.use_async_pathfinding(budget=0)
+        walks = []
+        for destination in [(12, 12, 0), (10, 3, 0), (2, 5, 0)]:
+            patron = self._build_thirsty_customer()
+            patron.move((3, 3, 0))
+            patron.current_activity = Walking(tavern_map, patron,
+                                              destination)
+            walks.append(patron.current_activity)
+        scheduler = tavern_map.path_requests
+        self.tick_for()
+        self.assertTrue(all(walk.planning for walk in walks))
+        self.assertEqual(str(walks[0]), 'Finding the way to 12, 12, 0')
+        # Without any budget, a single search is made at each tick
+        self.assertEqual(scheduler.searches, 1)
+        self.assertGreaterEqual(scheduler.pending(), 2)
+        self.tick_for()
+        self.assertEqual(scheduler.searches, 2)
+        self.assertCanTickTill(lambda: all(w.finished for w in walks), 20)
+        self.assertFalse(any(w.failed for w in walks))
+
+    def test_path_backends(self):
+        """All backends should find shortest paths over the same map."""
+        tavern_map = self.tavern_map
+        self.add_kitchen()
+        trips = [((3, 3, 0), (12, 12, 0)), ((2, 14, 0), (11, 2, 0)),
+                 ((7, 4, 0), (7, 8, 0)), ((3, 3, 0), (20, 20, 0)),
+                 ((10, 10, 0), (10, 10, 0))]
+        found = {}
+        for name in ['tcod', 'bfs', 'jps']:
+            tavern_map.use_backend(name)
+            found[name] = [tavern_map._compute_path(*trip) for trip in trips]
+            for (origin, destination), path in zip(trips, found[name]):
+                previous = origin
+                for step in path:
+                    self.assertTrue(tavern_map[step].is_walkable())
+                    self.assertLessEqual(max(abs(step[0] - previous[0]),
+                                             abs(step[1] - previous[1])), 1)
+                    previous = step
+                if path:
+                    self.assertEqual(path[-1], destination)
+        lengths = dict((name, [len(path) for path in paths])
+                       for name, paths in found.items())
+        self.assertEqual(lengths['tcod'][3:], [0, 0])
+        self.assertEqual(lengths['tcod'], lengths['jps'])
+        self.assertEqual(lengths['tcod'], lengths['bfs'])
+        self.assertEqual(tavern_map.backend.searches, len(trips))
+
+    def test_weighted_paths(self):
+        """Weighted paths should be the shortest ones on empty floors,
+        and go around crowds and counters."""
+        tavern_map = self.tavern_map
+        costs = tavern_map.costs
+        trip = ((2, 2, 0), (12, 5, 0))
+        shortest = tavern_map._compute_path(*trip)
+        tavern_map.use_backend('weighted')
+        self.assertEqual(len(tavern_map._compute_path(*trip)),
+                         len(shortest))
+        # People gather around the counter
+        self.assertEqual(costs.cost_at((10, 10, 0)), 2)
+        self.assertEqual(costs.cost_at((10, 5, 0)), 1)
+        self.assertEqual(costs.cost_at((0, 0, 0)), float('inf'))
+        # And crowds are avoided
+        costs.update_occupants([(10, 3, 0), (11, 3, 0), (11, 3, 0)])
+        self.assertEqual(costs.cost_at((11, 3, 0)), 5)
+        path = tavern_map.path_from_to((9, 3, 0), (12, 3, 0))
+        self.assertEqual(path[-1], (12, 3, 0))
+        self.assertNotIn((10, 3, 0), path)
+        self.assertNotIn((11, 3, 0), path)
+        costs.update_occupants([])
+        self.assertEqual(costs.cost_at((11, 3, 0)), 1)
+        self.assertEqual(tavern_map.path_from_to((9, 3, 0), (12, 3, 0)),
+                         [(10, 3, 0), (11, 3, 0), (12, 3, 0)])
+        # Weighted paths change with the crowd : they are not cached
+        self.assertEqual(len(tavern_map.path_cache), 0)
+        # Walks through doors are a single search, around crowded doors
+        searches = tavern_map.backend.searches
+        costs.update_occupants([(8, 3, 0), (8, 3, 0)])
+        path = tavern_map.path_from_to(*trip)
+        self.assertEqual(tavern_map.backend.searches, searches + 1)
+        self.assertEqual(path[-1], trip[1])
+        self.assertIn((8, 4, 0), path)
+        self.assertNotIn((8, 3, 0), path)
+
+    def test_cooperative_pathfinding(self):
+        """Walkers reserving their way should never stand on the same
+        tile, nor walk through those who stand still."""
+        tavern_map = self.tavern_map
+        tavern_map.use_cooperative_pathfinding(4)
+        cooperation = tavern_map.cooperation
+        bystander = self._build_thirsty_customer()
+        bystander.move((10, 6, 0))
+
+        def walk_all(trips, ticks, collisions=False):
+            walkers = []
+            walks = []
+            for origin, destination in trips:
+                walker = self._build_thirsty_customer()
+                walker.move(origin)
+                walkers.append(walker)
+                walks.append(Walking(tavern_map, walker, destination))
+            crowd = walkers + [bystander]
+            cooperation.advance(crowd)
+            for tick in range(ticks):
+                for walker, walk in zip(walkers, walks):
+                    if not walk.finished:
+                        walk.tick(tavern_map, walker)
+                cooperation.advance(crowd)
+                positions = [creature.to_pos() for creature in crowd]
+                if not collisions:
+                    self.assertEqual(len(set(positions)), len(positions))
+            for walker, walk, (_, destination) in zip(walkers, walks, trips):
+                self.assertTrue(walk.finished)
+                self.assertEqual(walker.to_pos(), destination)
+
+        walk_all([((9, 3, 0), (12, 10, 0)), ((12, 3, 0), (9, 10, 0)),
+                  ((9, 10, 0), (12, 3, 0)), ((12, 10, 0), (9, 3, 0)),
+                  ((10, 4, 0), (11, 9, 0)), ((11, 9, 0), (10, 4, 0))], 20)
+        self.assertLessEqual(len(cooperation.reservations), 6 * 4)
+        # Walks are planned again every half window
+        self.assertLess(cooperation.searches, 6 * 10)
+        # Jams in narrow corridors end up being walked through
+        bystander.move((7, 4, 0))
+        walk_all([((2, 3, 0), (12, 4, 0)), ((12, 3, 0), (2, 4, 0)),
+                  ((3, 3, 0), (10, 10, 0)), ((11, 4, 0), (3, 5, 0))],
+                 60, True)
+        tavern_map.use_cooperative_pathfinding(None)
+        self.assertIsNone(tavern_map.cooperation)
+
+    def test_cooperative_shared_destination(self):
+        """A crowd heading for the same tile should all get there,
+        sharing the destination but no other tile."""
+        tavern_map = self.tavern_map
+        tavern_map.use_cooperative_pathfinding(4)
+        cooperation = tavern_map.cooperation
+        destination = (9, 10, 0)
+        walkers = []
+        walks = []
+        for origin in [(9, 2, 0), (10, 2, 0), (11, 2, 0), (12, 2, 0),
+                       (12, 12, 0), (11, 12, 0), (12, 7, 0), (10, 5, 0)]:
+            walker = self._build_thirsty_customer()
+            walker.move(origin)
+            walkers.append(walker)
+            walks.append(Walking(tavern_map, walker, destination))
+        cooperation.advance(walkers)
+        for tick in range(20):
+            for walker, walk in zip(walkers, walks):
+                if not walk.finished:
+                    walk.tick(tavern_map, walker)
+            cooperation.advance(walkers)
+            positions = [walker.to_pos() for walker in walkers
+                         if not walker.is_at_pos(destination)]
+            self.assertEqual(len(set(positions)), len(positions))
+            if all(walk.finished for walk in walks):
+                break
+        for walker, walk in zip(walkers, walks):
+            self.assertTrue(walk.finished)
+            self.assertEqual(walker.to_pos(), destination)
+        # Nobody had to give up on cooperating
+        self.assertTrue(all(walk.waits < cooperation.patience
+                            for walk in walks))
+
+    def test_neighbor_tables(self):
+        """Neighbours come from tables, kept up to date as tiles
+        change."""
+        tavern_map = self.tavern_map
+        self.assertEqual(tavern_map.get_neighboring_coords_for((0, 0, 0)),
+                         ((1, 0, 0), (0, 1, 0), (1, 1, 0)))
+        self.assertEqual(
+            tavern_map.get_immediate_neighboring_coords((5, 5, 0)),
+            ((5, 4, 0), (4, 5, 0), (6, 5, 0), (5, 6, 0)))
+        moves = tavern_map.get_legit_moves_from((2, 2, 0))
+        self.assertEqual(set(moves), set([(3, 2, 0), (2, 3, 0), (3, 3, 0)]))
+        # Tables are shared, not built for each call
+        self.assertIs(tavern_map.get_legit_moves_from((2, 2, 0)), moves)
+        # Only the tiles looked up are kept
+        self.assertEqual(len(tavern_map.neighbors.moves[0]), 1)
+        self.assertEqual(tavern_map.neighbors.walkable_mask((2, 2, 0)),
+                         0b11010000)
+        tavern_map[(3, 3, 0)].wall = True
+        self.assertEqual(set(tavern_map.get_legit_moves_from((2, 2, 0))),
+                         set([(3, 2, 0), (2, 3, 0)]))
+        for i in range(20):
+            self.assertIn(tavern_map.random_move_from((2, 2, 0)),
+                          [(3, 2, 0), (2, 3, 0)])
+        self.add_kitchen()
+        for x in range(14):
+            for y in range(16):
+                pos = (x, y, 0)
+                expected = set(pos2 for pos2
+                               in tavern_map.get_neighboring_coords_for(pos)
+                               if tavern_map[pos2].is_walkable())
+                self.assertEqual(set(tavern_map.get_legit_moves_from(pos)),
+                                 expected)
+        self.assertIsNone(tavern_map.random_move_from((30, 30, 0)))
+
+    def test_packed_coordinates(self):
+        """Registries keep packed positions, but give and take
+        (x, y, z) tuples."""
+        coords = self.tavern_map.coords
+        for pos in [(0, 0, 0), (99, 0, 0), (0, 119, 0), (42, 17, 3)]:
+            key = coords.pack(pos)
+            self.assertEqual(coords.unpack(key), pos)
+            self.assertEqual((coords.x_of(key), coords.y_of(key),
+                              coords.z_of(key)), pos)
+        self.assertEqual(coords.pack((1, 2, 3)),
+                         3 * 100 * 120 + 2 * 100 + 1)
+        self.add_chair()
+        services = self.tavern_map.available_services[Functions.SITTING]
+        self.assertIn((9, 6, 0), services)
+        self.assertIn([9, 6, 0], services)
+        self.assertEqual(list(services), [(9, 6, 0)])
+        self.assertEqual(services.closest_to((2, 2, 0)), (9, 6, 0))
+        room = self.tavern_map.room_at((3, 3, 0))
+        self.assertIn((3, 3, 0), room)
+        self.assertNotIn((10, 10, 0), room)
+        self.assertIn((3, 3, 0), list(room))
+
+    def test_position_table(self):
+        """The position table follows creatures that come, move and
+        leave, and walking costs follow the table."""
+        table = self.tavern.table
+        costs = self.tavern_map.costs
+        self.customers.make_customer()
+        patron = self.tavern.creatures[-1]
+        publican = self.tavern.creatures[0]
+        self.assertIn(patron, table)
+        self.assertEqual(len(table), len(self.tavern.creatures))
+        patron.move((10, 5, 0))
+        publican.move((10, 5, 0))
+        self.assertTrue(table.changed)
+        keys, counts = table.occupancy()
+        key = self.tavern_map.coords.pack((10, 5, 0))
+        self.assertEqual(counts[keys.tolist().index(key)], 2)
+        costs.update_occupancy(keys, counts)
+        self.assertEqual(costs.cost_at((10, 5, 0)), 5)
+        self.tavern.remove_creature(patron)
+        self.assertNotIn(patron, table)
+        self.assertIsNone(patron.table)
+        costs.update_occupancy(*table.occupancy())
+        self.assertEqual(costs.cost_at((10, 5, 0)), 3)
+        publican.move((10, 6, 0))
+        costs.update_occupancy(*table.occupancy())
+        self.assertEqual(costs.cost_at((10, 5, 0)), 1)
+        self.assertEqual(dict(costs.occupants), {(10, 6, 0): 1})
+        # The world only gives occupants to searches using costs
+        updates = []
+        costs.update_occupancy = lambda *occupancy: updates.append(occupancy)
+        publican.move((10, 7, 0))
+        self.tick_for()
+        self.assertEqual(updates, [])
+        self.assertTrue(table.changed)
+        self.tavern_map.use_backend('weighted')
+        self.tick_for()
+        self.assertEqual(len(updates), 1)